@@ -0,0 +1,221 @@
+import asyncio
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class Overloaded(Exception):
+    """Too many requests are already waiting; retry after `retry_after` seconds"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM upstream saturated, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CircuitOpen(Exception):
+    """The upstream has been failing; calls are short-circuited for now"""
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures.
+
+    While open every call is rejected; after `reset_timeout` seconds a
+    single trial call is let through (half-open) and its outcome closes or
+    re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_ignored(self) -> None:
+        """The call failed for a reason unrelated to upstream health"""
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self.trial_in_flight = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class AdmissionController:
+    """Bounded concurrency, queueing, deadlines and retries for upstream calls.
+
+    At most `max_concurrency` calls run at once and at most `max_queue`
+    wait for a slot; beyond that callers get `Overloaded` immediately.
+    Each admitted request must finish within `deadline` seconds including
+    queueing and retries, and every upstream attempt gets at least
+    `min_call_budget` of it: a request still queued past that point is
+    rejected as overloaded, so local queueing never shows up as upstream
+    timeouts. Errors for which `is_transient` is true are retried with
+    jittered exponential backoff and count against the circuit breaker.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, deadline: float, retries: int,
+                 backoff: float, breaker: CircuitBreaker, is_transient: Callable[[BaseException], bool],
+                 min_call_budget: float = 2.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker
+        self.is_transient = is_transient
+        self.min_call_budget = min(min_call_budget, deadline)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+        self._avg_latency = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until a queued slot is likely to free up"""
+        backlog = (self.waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(self._avg_latency * backlog))
+
+    def check(self) -> None:
+        """Raise right away if a new request would not be admitted"""
+        if self.breaker.state == "open":
+            raise CircuitOpen()
+        if self.running + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise Overloaded(self.retry_after())
+
+    async def _acquire(self, timeout: float) -> None:
+        self.check()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(self.retry_after())
+        finally:
+            self.waiting -= 1
+        self.running += 1
+
+    def _release(self, started: float) -> None:
+        self.running -= 1
+        self._semaphore.release()
+        self._avg_latency = 0.8 * self._avg_latency + 0.2 * (time.monotonic() - started)
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        await self._acquire(self.deadline - self.min_call_budget)
+        started = time.monotonic()
+        try:
+            attempt = 0
+            while True:
+                if not self.breaker.allow():
+                    raise CircuitOpen()
+                try:
+                    result = await asyncio.wait_for(call(), max(0.0, deadline - loop.time()))
+                except asyncio.CancelledError:
+                    self.breaker.record_ignored()
+                    raise
+                except Exception as e:
+                    if not (isinstance(e, asyncio.TimeoutError) or self.is_transient(e)):
+                        self.breaker.record_ignored()
+                        raise
+                    self.breaker.record_failure()
+                    delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+                    if attempt >= self.retries or loop.time() + delay + self.min_call_budget > deadline:
+                        raise
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+                self.breaker.record_success()
+                return result
+        finally:
+            self._release(started)
+
+    @staticmethod
+    async def _until(chunks: AsyncIterator[T], deadline: float) -> AsyncIterator[T]:
+        """Pass `chunks` through, raising asyncio.TimeoutError at `deadline`"""
+        loop = asyncio.get_running_loop()
+        iterator = chunks.__aiter__()
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), max(0.0, deadline - loop.time()))
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        finally:
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold a slot for a streamed call; streams are not retried.
+
+        Queueing follows the same deadline as `run`. The context yields a
+        wrapper for the stream that raises asyncio.TimeoutError once the
+        deadline passes, checked before every chunk, so a stalled upstream
+        or a slow reader can't hold the slot for longer.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        await self._acquire(self.deadline - self.min_call_budget)
+        started = time.monotonic()
+        if not self.breaker.allow():
+            self._release(started)
+            raise CircuitOpen()
+        try:
+            yield lambda chunks: self._until(chunks, deadline)
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError) or self.is_transient(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_ignored()
+            raise
+        except BaseException:
+            # Cancelled, or the stream was closed early (client gone); a
+            # half-open trial must not stay in flight forever
+            self.breaker.record_ignored()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._release(started)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "circuit": self.breaker.state
+        }
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Chat archival: compacts old chats into per-pet compressed segments.
+
+Chats older than a cutoff are moved, in runs of up to `segment_size`, out
+of the `chats` collection into `chat_segments` documents holding the
+zlib-compressed BSON of the chats, their memory vectors and sentiment and
+emotion aggregates. Each pet keeps cumulative aggregates in `chat_archive`
+and a rolling `conversation_summary` built from them for the prompt.
+`ChatArchive` reads history across the remaining chats and the segments.
+
+The server runs the job periodically with CHAT_ARCHIVE=true; it can also
+be run by hand:
+
+    python archive.py --days 90 [--segment-size 500] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+import re
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import bson
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo.errors import DuplicateKeyError
+
+from cache import LRUTTLCache
+from database import ORIGIN
+
+logger = logging.getLogger(__name__)
+
+# Segment fields needed to walk segments without their payload
+SEGMENT_BOUNDS = {"first_timestamp": 1, "first_id": 1, "last_timestamp": 1, "last_id": 1, "count": 1}
+
+# Topic words: letters only, at least four of them
+TOPIC_PATTERN = re.compile(r"[^\W\d_]{4,}")
+STOPWORDS = {
+    "about", "after", "again", "also", "been", "before", "being", "could", "does", "doing", "from",
+    "have", "having", "here", "just", "know", "like", "made", "make", "more", "much", "must",
+    "really", "should", "some", "such", "than", "that", "their", "them", "then", "there", "these",
+    "they", "thing", "things", "think", "this", "those", "today", "very", "want", "well", "were",
+    "what", "when", "where", "which", "while", "will", "with", "would", "your", "yours",
+}
+MAX_TOPICS = 50
+SUMMARY_TOPICS = 5
+
+
+def position(chat: dict) -> Tuple[datetime, ObjectId]:
+    return chat["timestamp"], chat["_id"]
+
+
+def pack_chats(chats: List[dict]) -> bytes:
+    return zlib.compress(bson.encode({"chats": chats}), 6)
+
+
+def unpack_chats(data: bytes) -> List[dict]:
+    return bson.decode(zlib.decompress(data))["chats"]
+
+
+def project(doc: dict, projection: Optional[dict]) -> dict:
+    """Apply a Mongo inclusion or exclusion projection to a copy of `doc`,
+    for documents read from segments rather than from Mongo"""
+    if not projection:
+        return dict(doc)
+    if any(projection.values()):
+        return {key: value for key, value in doc.items() if key == "_id" or projection.get(key)}
+    return {key: value for key, value in doc.items() if key not in projection}
+
+
+# Aggregates
+def aggregate(chats: List[dict]) -> dict:
+    """Sentiment, emotion and topic aggregates of a run of chats"""
+    sentiments = [chat["user_sentiment"] for chat in chats if chat.get("user_sentiment") is not None]
+    topics = Counter(
+        word
+        for chat in chats
+        for word in TOPIC_PATTERN.findall((chat.get("user_message") or "").lower())
+        if word not in STOPWORDS
+    )
+    return {
+        "chats": len(chats),
+        "first": chats[0]["timestamp"],
+        "last": chats[-1]["timestamp"],
+        "last_id": chats[-1]["_id"],
+        "sentiment_sum": sum(sentiments),
+        "sentiment_count": len(sentiments),
+        "sentiment_min": min(sentiments, default=None),
+        "sentiment_max": max(sentiments, default=None),
+        "emotions": dict(Counter(chat["emotion"] for chat in chats if chat.get("emotion"))),
+        "topics": dict(topics.most_common(MAX_TOPICS)),
+    }
+
+
+def merge_aggregates(total: Optional[dict], part: dict) -> dict:
+    """Fold a later run's aggregates into the running total. Topic counts
+    are kept for the top MAX_TOPICS only, so they are approximate."""
+    if not total:
+        return part
+
+    def bound(pick, a, b):
+        values = [value for value in (a, b) if value is not None]
+        return pick(values) if values else None
+
+    def add(a: dict, b: dict) -> Counter:
+        counts = Counter(a)
+        counts.update(b)
+        return counts
+
+    return {
+        "chats": total["chats"] + part["chats"],
+        "first": total["first"],
+        "last": part["last"],
+        "last_id": part["last_id"],
+        "sentiment_sum": total["sentiment_sum"] + part["sentiment_sum"],
+        "sentiment_count": total["sentiment_count"] + part["sentiment_count"],
+        "sentiment_min": bound(min, total["sentiment_min"], part["sentiment_min"]),
+        "sentiment_max": bound(max, total["sentiment_max"], part["sentiment_max"]),
+        "emotions": dict(add(total["emotions"], part["emotions"])),
+        "topics": dict(add(total["topics"], part["topics"]).most_common(MAX_TOPICS)),
+    }
+
+
+def summarize(aggregates: dict) -> str:
+    """Rolling conversation summary for the prompt, from archive aggregates"""
+    parts = [f"You have talked {aggregates['chats']} times with your owner between "
+             f"{aggregates['first']:%B %Y} and {aggregates['last']:%B %Y}."]
+    emotions = aggregates["emotions"]
+    if emotions:
+        mood = max(emotions, key=emotions.get).replace("_", " ")
+        average = aggregates["sentiment_sum"] / max(1, aggregates["sentiment_count"])
+        parts.append(f"They were mostly {mood} (average sentiment {average:+.2f}).")
+    topics = sorted(aggregates["topics"], key=aggregates["topics"].get, reverse=True)[:SUMMARY_TOPICS]
+    if topics:
+        parts.append(f"They often talked about {', '.join(topics)}.")
+    return " ".join(parts)
+
+
+# Reading
+class ChatArchive:
+    """Chat history across the chats collection and archived segments.
+
+    Segments hold the oldest part of each pet's history, so reads go to the
+    remaining (hot) chats first and only continue into segments once those
+    are exhausted. Decompressed segments are cached; only rescoring
+    rewrites a segment, which readers then see once the entry expires.
+    """
+
+    def __init__(self, database, cache_size: int = 256, cache_ttl: float = 600):
+        self.database = database
+        self._segments = LRUTTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    async def segment_chats(self, segment_id: ObjectId) -> List[dict]:
+        """The chats of a segment, oldest first"""
+        chats = self._segments.get(segment_id)
+        if chats is None:
+            segment = await self.database.segments.get(segment_id, {"data": 1})
+            chats = unpack_chats(segment["data"]) if segment else []
+            self._segments.set(segment_id, chats)
+        return chats
+
+    async def page(self, pet_id: str, limit: int, before: Optional[Tuple[datetime, ObjectId]] = None,
+                   after: Optional[Tuple[datetime, ObjectId]] = None,
+                   projection: Optional[dict] = None) -> Tuple[List[dict], bool]:
+        """Same contract as ChatRepository.page, over the whole history"""
+        if after is not None:
+            archived, has_more = await self._archived_after(pet_id, after, limit)
+            archived = [project(chat, projection) for chat in archived]
+            if has_more:
+                return archived, True
+            start = position(archived[-1]) if archived else after
+            chats, has_more = await self.database.chats.page(
+                pet_id, limit - len(archived), after=start, projection=projection
+            )
+            return archived + chats, has_more
+
+        chats, has_more = await self.database.chats.page(pet_id, limit, before=before, projection=projection)
+        if has_more:
+            return chats, True
+        # Hot chats are exhausted in this direction; segments hold anything older
+        archived, has_more = await self._archived_before(
+            pet_id, position(chats[0]) if chats else before, limit - len(chats)
+        )
+        return [project(chat, projection) for chat in archived] + chats, has_more
+
+    async def _archived_before(self, pet_id: str, end: Optional[Tuple[datetime, ObjectId]],
+                               count: int) -> Tuple[List[dict], bool]:
+        """Up to `count` archived chats older than `end`, and whether more exist"""
+        collected = []
+        while True:
+            segments = await self.database.segments.before(pet_id, end, 1, SEGMENT_BOUNDS)
+            if not segments:
+                return collected, False
+            needed = count - len(collected)
+            if needed == 0:
+                return collected, True
+            chats = await self.segment_chats(segments[0]["_id"])
+            if end is not None:
+                chats = [chat for chat in chats if position(chat) < end]
+            if len(chats) > needed:
+                return chats[-needed:] + collected, True
+            collected = chats + collected
+            end = (segments[0]["first_timestamp"], segments[0]["first_id"])
+
+    async def _archived_after(self, pet_id: str, start: Tuple[datetime, ObjectId],
+                              count: int) -> Tuple[List[dict], bool]:
+        """Up to `count` archived chats newer than `start`, and whether more exist"""
+        collected = []
+        while True:
+            segments = await self.database.segments.after(pet_id, start, 1, SEGMENT_BOUNDS)
+            if not segments:
+                return collected, False
+            needed = count - len(collected)
+            if needed == 0:
+                return collected, True
+            chats = [chat for chat in await self.segment_chats(segments[0]["_id"]) if position(chat) > start]
+            if len(chats) > needed:
+                return collected + chats[:needed], True
+            collected += chats
+            start = (segments[0]["last_timestamp"], segments[0]["last_id"])
+
+    def stats(self) -> dict:
+        return self._segments.stats()
+
+
+# Archiving
+class ChatArchiver:
+    """Periodic job moving chats older than `archive_after` into segments.
+
+    A run is claimed through the jobs collection, so it happens at most
+    once per `interval` across all server processes. Each segment is
+    stored before its chats are deleted and a rerun after a crash in
+    between finishes the deletion, so no chat is lost or archived twice.
+    Runs shorter than `min_segment_size` wait until more chats age.
+    `on_pet_update(pet_id)` is awaited after a pet's summary is rewritten.
+    """
+
+    def __init__(self, database, archive_after: timedelta, interval: float = 3600,
+                 segment_size: int = 500, min_segment_size: int = 50, poll_interval: float = 60,
+                 on_pet_update: Optional[Callable[[str], Awaitable[None]]] = None):
+        self.database = database
+        self.on_pet_update = on_pet_update
+        self.archive_after = archive_after
+        self.interval = timedelta(seconds=interval)
+        self.segment_size = segment_size
+        self.min_segment_size = min_segment_size
+        self.poll_interval = poll_interval
+        self.archived = 0
+        self.segments = 0
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Chat archive run failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def run_once(self, now: datetime = None) -> int:
+        now = now or datetime.utcnow()
+        if await self.database.jobs.claim("chat_archive", self.interval, now) is None:
+            return 0
+        archived = await self.archive_all(now - self.archive_after)
+        if archived:
+            logger.info("Archived %d chats", archived)
+        return archived
+
+    async def archive_all(self, cutoff: datetime, dry_run: bool = False) -> int:
+        """Archive every pet's chats older than `cutoff`; returns the chat count"""
+        archived = 0
+        # Only pets with chats old enough are visited, not every pet
+        for pet_id in await self.database.chats.pets_before(cutoff):
+            try:
+                pet = await self.database.pets.get(pet_id, {"chat_archive": 1})
+                if pet is not None:
+                    archived += await self.archive_pet(pet, cutoff, dry_run)
+            except Exception:
+                logger.exception("Archiving chats of pet %s failed", pet_id)
+        return archived
+
+    async def archive_pet(self, pet: dict, cutoff: datetime, dry_run: bool = False) -> int:
+        pet_id = str(pet["_id"])
+        totals = pet.get("chat_archive")
+        archived = 0
+        start = ORIGIN
+        while True:
+            chats, _ = await self.database.chats.page(pet_id, self.segment_size, after=start)
+            chats = [chat for chat in chats if chat["timestamp"] < cutoff]
+            if len(chats) < max(1, self.min_segment_size):
+                return archived
+            if not dry_run:
+                totals = await self._write_segment(pet_id, chats, totals)
+            archived += len(chats)
+            if len(chats) < self.segment_size:
+                return archived
+            start = position(chats[-1])
+
+    async def _write_segment(self, pet_id: str, chats: List[dict], totals: Optional[dict]) -> dict:
+        stats = aggregate(chats)
+        segment = {
+            "pet_id": pet_id,
+            "first_timestamp": chats[0]["timestamp"],
+            "first_id": chats[0]["_id"],
+            "last_timestamp": chats[-1]["timestamp"],
+            "last_id": chats[-1]["_id"],
+            "count": len(chats),
+            "data": pack_chats([{k: v for k, v in chat.items() if k != "embedding"} for chat in chats]),
+            "embeddings": [chat.get("embedding") for chat in chats],
+            "stats": stats,
+            "archived_at": datetime.utcnow(),
+        }
+        try:
+            await self.database.segments.insert(segment)
+            self.segments += 1
+        except DuplicateKeyError:
+            # An earlier run stored this segment but stopped before deleting its chats
+            segment = await self.database.segments.find_first(
+                pet_id, position(chats[0]), {**SEGMENT_BOUNDS, "stats": 1}
+            )
+            end = (segment["last_timestamp"], segment["last_id"])
+            chats = [chat for chat in chats if position(chat) <= end]
+            stats = segment["stats"]
+
+        end = (stats["last"], stats["last_id"])
+        if not totals or (totals["last"], totals["last_id"]) < end:
+            totals = merge_aggregates(totals, stats)
+            await self.database.pets.update(pet_id, {"chat_archive": totals, "conversation_summary": summarize(totals)})
+            if self.on_pet_update is not None:
+                await self.on_pet_update(pet_id)
+        self.archived += await self.database.chats.delete_many([chat["_id"] for chat in chats])
+        return totals
+
+    def stats(self) -> dict:
+        return {"archived": self.archived, "segments": self.segments}
+
+
+async def run(args) -> None:
+    from database import Database
+
+    database = Database.from_env()
+    database.connect()
+    try:
+        await database.ensure_indexes()
+        archiver = ChatArchiver(database, timedelta(days=args.days), segment_size=args.segment_size,
+                                min_segment_size=args.min_segment_size)
+        cutoff = datetime.utcnow() - archiver.archive_after
+        archived = await archiver.archive_all(cutoff, dry_run=args.dry_run)
+        mode = " (dry run, nothing written)" if args.dry_run else ""
+        print(f"Done{mode}: {archived} chats older than {cutoff:%Y-%m-%d %H:%M} archived "
+              f"into {archiver.segments} segments")
+    finally:
+        database.close()
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Archive old chats into compressed per-pet segments")
+    parser.add_argument("--days", type=float, default=90, help="archive chats older than this many days")
+    parser.add_argument("--segment-size", type=int, default=500, help="chats per segment")
+    parser.add_argument("--min-segment-size", type=int, default=50,
+                        help="leave a pet's old chats until at least this many have aged")
+    parser.add_argument("--dry-run", action="store_true", help="count what would be archived without writing")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark the compiled sentiment engine against the original keyword scan.
+
+Usage: python bench_sentiment.py [--words 2000] [--messages 200] [--repeat 5]
+"""
+
+import argparse
+import random
+import timeit
+
+from sentiment import default_engine, POSITIVE_WORDS, NEGATIVE_WORDS
+
+
+def legacy_analyze_sentiment(text: str) -> float:
+    """The substring-scan implementation previously in server.py"""
+    positive_words = ['love', 'happy', 'joy', 'great', 'awesome', 'wonderful', 'good', 'nice', 'beautiful', 'amazing', 'excited', 'yes', 'perfect', 'best']
+    negative_words = ['hate', 'sad', 'bad', 'terrible', 'awful', 'horrible', 'no', 'never', 'angry', 'upset', 'disappointed', 'lonely', 'miss']
+
+    text_lower = text.lower()
+    positive_count = sum(1 for word in positive_words if word in text_lower)
+    negative_count = sum(1 for word in negative_words if word in text_lower)
+
+    total = positive_count + negative_count
+    if total == 0:
+        return 0.0
+
+    score = (positive_count - negative_count) / max(total, 1)
+    return max(-1.0, min(1.0, score))
+
+
+FILLER = (
+    "today I went to the park with my friend and we talked about the mission "
+    "you know the weather was warm and the dog kept running around the trees"
+).split()
+
+
+def make_messages(count: int, words: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    vocabulary = FILLER * 8 + list(POSITIVE_WORDS) + list(NEGATIVE_WORDS) + ["not"]
+    return [" ".join(rng.choice(vocabulary) for _ in range(words)) + "." for _ in range(count)]
+
+
+def bench(label: str, fn, repeat: int, number: int = 1) -> float:
+    best = min(timeit.repeat(fn, repeat=repeat, number=number))
+    print(f"{label:<40} {best * 1000:10.2f} ms")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", type=int, default=2000, help="words per message")
+    parser.add_argument("--messages", type=int, default=200, help="messages per run")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    long_messages = make_messages(args.messages, args.words)
+    short_messages = make_messages(args.messages * 10, 12)
+    print(f"{args.messages} messages x {args.words} words, {len(short_messages)} short messages")
+
+    for label, messages in (("long", long_messages), ("short", short_messages)):
+        legacy = bench(f"legacy analyze_sentiment ({label})",
+                       lambda: [legacy_analyze_sentiment(m) for m in messages], args.repeat)
+        engine = bench(f"SentimentEngine.score ({label})",
+                       lambda: [default_engine.score(m) for m in messages], args.repeat)
+        bench(f"SentimentEngine.score_many ({label})",
+              lambda: default_engine.score_many(messages), args.repeat)
+        print(f"{'ratio engine/legacy':<40} {engine / legacy:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
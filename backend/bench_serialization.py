@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark encoding a chat history page: the previous serialize_doc +
+jsonable_encoder + json.dumps path against ORJSONResponse's encoder.
+
+Usage: python bench_serialization.py [--messages 100] [--number 200] [--repeat 5]
+"""
+
+import argparse
+import copy
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from serialization import dumps
+
+
+def legacy_serialize_doc(doc):
+    """The helper previously in server.py"""
+    if doc and "_id" in doc:
+        doc["_id"] = str(doc["_id"])
+    return doc
+
+
+def legacy_encode(page: dict) -> bytes:
+    """What returning the page dict used to cost: per-chat serialize_doc,
+    FastAPI's jsonable_encoder pass and JSONResponse.render"""
+    page["chats"] = [legacy_serialize_doc(chat) for chat in page["chats"]]
+    content = jsonable_encoder(page)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def make_page(messages: int, seed: int = 7) -> dict:
+    rng = random.Random(seed)
+    start = datetime(2024, 5, 1, 12, 0, 0)
+    chats = []
+    for i in range(messages):
+        chats.append({
+            "_id": ObjectId(),
+            "pet_id": "6650f1c2a1b2c3d4e5f60718",
+            "user_message": "How was your day? " * rng.randint(1, 4),
+            "ai_response": "I had the best day ever thinking about you! 💕 " * rng.randint(1, 3),
+            "user_sentiment": rng.uniform(-1, 1),
+            "emotion": rng.choice(["happy", "neutral", "sad"]),
+            "timestamp": start + timedelta(seconds=37 * i, milliseconds=rng.randint(0, 999)),
+        })
+    return {"chats": chats, "has_more": True, "before_cursor": "1714564800000_x", "after_cursor": None}
+
+
+def bench(label: str, encode, messages: int, number: int, repeat: int) -> float:
+    """Best per-page time; pages are built outside the timed loop since the
+    legacy path rewrites them in place"""
+    best = float("inf")
+    for _ in range(repeat):
+        pages = [make_page(messages) for _ in range(number)]
+        started = time.perf_counter()
+        for page in pages:
+            encode(page)
+        best = min(best, (time.perf_counter() - started) / number)
+    print(f"{label:<40} {best * 1e6:10.1f} µs/page")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100, help="chats per history page")
+    parser.add_argument("--number", type=int, default=200, help="pages encoded per run")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    # Both paths must produce the same JSON document
+    page = make_page(args.messages)
+    assert json.loads(dumps(page)) == json.loads(legacy_encode(copy.deepcopy(page)))
+
+    print(f"History page of {args.messages} chats")
+    legacy = bench("serialize_doc + jsonable_encoder + json", legacy_encode, args.messages, args.number, args.repeat)
+    fast = bench("orjson (ORJSONResponse)", dumps, args.messages, args.number, args.repeat)
+    print(f"{'speedup':<40} {legacy / fast:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+from cachetools import TTLCache
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
+import asyncio
+import hashlib
+import time
+
+
+class LRUTTLCache:
+    """Bounded LRU cache whose entries also expire after `ttl` seconds.
+
+    Keeps hit/miss/eviction counters so the cache can be sized from
+    production numbers.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Look up without touching the hit/miss counters"""
+        return self._entries.get(key)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = value
+
+    def invalidate(self, key: Hashable) -> None:
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self._entries.maxsize,
+            "ttl": self._entries.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+class ResponseCache:
+    """Exact-match cache of LLM replies with single-flight coalescing.
+
+    Keys hash the system prompt, the last `context_turns` conversation
+    turns and the user message, all whitespace/case normalized. Concurrent
+    misses for the same key share one upstream call, which runs in its own
+    task so a disconnecting client does not cancel it for the others.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, context_turns: int = 1):
+        self._entries = LRUTTLCache(maxsize, ttl)
+        self._in_flight = {}
+        self.context_turns = context_turns
+        self.coalesced = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.lower().split()).rstrip(".!?~ ")
+
+    def key(self, messages: List[dict]) -> str:
+        system = [m["content"] for m in messages if m["role"] == "system"]
+        turns = [m for m in messages[:-1] if m["role"] != "system"]
+        context = turns[-2 * self.context_turns:] if self.context_turns else []
+        parts = system + [f"{m['role']}:{self.normalize(m['content'])}" for m in context]
+        parts.append(self.normalize(messages[-1]["content"]))
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    def get(self, messages: List[dict]) -> Optional[Any]:
+        entry = self._entries.get(self.key(messages))
+        if entry is None:
+            return None
+        value, latency = entry
+        self.saved_seconds += latency
+        return value
+
+    def peek(self, messages: List[dict]) -> Optional[Any]:
+        """Look up without touching the counters"""
+        entry = self._entries.peek(self.key(messages))
+        return entry[0] if entry is not None else None
+
+    def set(self, messages: List[dict], value: Any, latency: float) -> None:
+        self._entries.set(self.key(messages), (value, latency))
+
+    async def get_or_compute(self, messages: List[dict], compute: Callable[[], Awaitable[Any]]) -> Any:
+        key = self.key(messages)
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, latency = entry
+            self.saved_seconds += latency
+            return value
+
+        task = self._in_flight.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.ensure_future(self._fill(key, compute))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.coalesced += 1
+
+        value, latency = await asyncio.shield(task)
+        if not leader:
+            self.saved_seconds += latency
+        return value
+
+    async def _fill(self, key: str, compute: Callable[[], Awaitable[Any]]):
+        started = time.perf_counter()
+        value = await compute()
+        latency = time.perf_counter() - started
+        self._entries.set(key, (value, latency))
+        return value, latency
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        self._in_flight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every waiter went away
+
+    def stats(self) -> dict:
+        stats = self._entries.stats()
+        stats.update({
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "saved_seconds": round(self.saved_seconds, 3)
+        })
+        return stats
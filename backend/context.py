@@ -0,0 +1,77 @@
+import os
+from typing import List, Optional
+
+# Rough per-message framing cost of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Fields of the recent chats read for the prompt
+CONTEXT_PROJECTION = {"user_message": 1, "ai_response": 1}
+
+
+def context_history_limit() -> int:
+    """Newest chats read for the prompt (read after .env is loaded)"""
+    return int(os.getenv("CONTEXT_HISTORY_LIMIT", "20"))
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate (~4 characters per token for English)"""
+    return (len(text) + 3) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+def build_context(system_prompt: str, recent_chats: List[dict], message: str,
+                  token_budget: int, summary: Optional[str] = None,
+                  memories: Optional[List[dict]] = None) -> List[dict]:
+    """Assemble LLM messages within a prompt token budget.
+
+    `recent_chats` is newest first. Turns are taken from the newest back
+    until the budget is spent and then emitted in chronological order, so
+    the latest exchanges are never crowded out. What is left goes to the
+    stored rolling `summary` of older conversation, included ahead of the
+    turns when it fits, and then to as many recalled `memories` (old chats
+    relevant to the message, best first) as still fit.
+    """
+    used = estimate_tokens(system_prompt) + estimate_tokens(message)
+
+    turns = []
+    for chat in recent_chats:
+        user_message = chat.get("user_message", "")
+        ai_response = chat.get("ai_response", "")
+        cost = estimate_tokens(user_message) + estimate_tokens(ai_response)
+        if used + cost > token_budget:
+            break
+        used += cost
+        turns.append((user_message, ai_response))
+
+    summary_message = None
+    if summary:
+        summary_message = {"role": "system", "content": f"Summary of your earlier conversations: {summary}"}
+        summary_tokens = estimate_tokens(summary_message["content"])
+        if used + summary_tokens <= token_budget:
+            used += summary_tokens
+        else:
+            summary_message = None
+
+    memory_message = None
+    remembered = []
+    for chat in memories or []:
+        line = f"- They said: {chat.get('user_message', '')} / You said: {chat.get('ai_response', '')}"
+        cost = estimate_tokens(line)
+        if used + cost + MESSAGE_OVERHEAD_TOKENS > token_budget:
+            break
+        used += cost
+        remembered.append(line)
+    if remembered:
+        used += MESSAGE_OVERHEAD_TOKENS
+        memory_message = {"role": "system",
+                          "content": "Things you remember from earlier conversations:\n" + "\n".join(remembered)}
+
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary_message:
+        messages.append(summary_message)
+    if memory_message:
+        messages.append(memory_message)
+    for user_message, ai_response in reversed(turns):
+        messages.append({"role": "user", "content": user_message})
+        messages.append({"role": "assistant", "content": ai_response})
+    messages.append({"role": "user", "content": message})
+    return messages
@@ -0,0 +1,405 @@
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from bson import ObjectId
+from datetime import datetime, timedelta
+from typing import Dict, Optional, List, Tuple
+import math
+import os
+
+from indexes import ensure_indexes
+
+
+STAT_MIN = 0
+STAT_MAX = 100
+STAT_DEFAULT = 50
+EPOCH = datetime(1970, 1, 1)
+# A (timestamp, _id) chat position before any chat
+ORIGIN = (EPOCH, ObjectId("0" * 24))
+# Chat history reads return everything but internal fields by default
+HISTORY_PROJECTION = {"embedding": 0}
+HISTORY_PAGE_SIZE = 20
+
+
+def clamp_expr(expr) -> dict:
+    """Aggregation expression clamping `expr` to the stat range"""
+    return {"$min": [STAT_MAX, {"$max": [STAT_MIN, expr]}]}
+
+
+def delta_stage(deltas: dict, fields: dict) -> dict:
+    """Pipeline $set stage adding clamped deltas to stats and setting fields"""
+    stage = {
+        field: clamp_expr({"$add": [{"$ifNull": [f"${field}", STAT_DEFAULT]}, delta]})
+        for field, delta in deltas.items()
+    }
+    stage.update({field: {"$literal": value} for field, value in fields.items()})
+    return stage
+
+
+def decay_stage(until: datetime, hourly: dict) -> dict:
+    """Pipeline $set stage materializing stat decay up to `until`.
+
+    Server-side twin of decay.decay_deltas: each stat moves by the
+    difference of floor(|rate| * hours since epoch) between `decayed_at`
+    (or `updated_at`) and `until`, clamped to the stat range.
+    """
+    since = {"$ifNull": ["$decayed_at", {"$ifNull": ["$updated_at", {"$literal": until}]}]}
+    since_hours = {"$divide": [{"$subtract": [since, EPOCH]}, 3600 * 1000]}
+    until_hours = (until - EPOCH) / timedelta(hours=1)
+    stage = {}
+    for field, rate in hourly.items():
+        if not rate:
+            continue
+        steps = {"$max": [0, {"$subtract": [
+            math.floor(abs(rate) * until_hours),
+            {"$floor": {"$multiply": [abs(rate), since_hours]}}
+        ]}]}
+        delta = steps if rate > 0 else {"$multiply": [-1, steps]}
+        stage[field] = clamp_expr({"$add": [{"$ifNull": [f"${field}", STAT_DEFAULT]}, delta]})
+    stage["decayed_at"] = {"$literal": until}
+    return stage
+
+
+def stale_stats_query(stale_before: datetime) -> dict:
+    """Stats whose decay was last materialized before `stale_before`"""
+    return {"$or": [
+        {"decayed_at": {"$lt": stale_before}},
+        {"decayed_at": None, "updated_at": {"$lt": stale_before}}
+    ]}
+
+
+# Repositories
+class UserRepository:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"user_id": user_id})
+
+    async def upsert(self, user_id: str, fields: dict) -> None:
+        await self.collection.update_one(
+            {"user_id": user_id},
+            {"$set": fields, "$setOnInsert": {"created_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+
+class PetRepository:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, pet_id: str, projection: Optional[dict] = None) -> Optional[dict]:
+        return await self.collection.find_one({"_id": ObjectId(pet_id)}, projection)
+
+    async def create(self, pet_data: dict) -> str:
+        result = await self.collection.insert_one(pet_data)
+        return str(result.inserted_id)
+
+    async def touch(self, pet_id: str, when: datetime) -> None:
+        """Record an interaction with the pet"""
+        await self.collection.update_one(
+            {"_id": ObjectId(pet_id)},
+            {"$set": {"last_interaction": when, "inactive": False}}
+        )
+
+    async def touch_many(self, touches: Dict[str, datetime]) -> int:
+        """Record interactions for many pets in one unordered bulk write;
+        $max keeps a later interaction already stored"""
+        if not touches:
+            return 0
+        result = await self.collection.bulk_write(
+            [UpdateOne({"_id": ObjectId(pet_id)},
+                       {"$max": {"last_interaction": when}, "$set": {"inactive": False}})
+             for pet_id, when in touches.items()],
+            ordered=False
+        )
+        return result.modified_count
+
+    async def update(self, pet_id: str, fields: dict) -> None:
+        await self.collection.update_one({"_id": ObjectId(pet_id)}, {"$set": fields})
+
+    async def flag_inactive(self, cutoff: datetime) -> int:
+        """Flag every pet not interacted with since `cutoff` as inactive"""
+        result = await self.collection.update_many(
+            {"last_interaction": {"$lt": cutoff}, "inactive": {"$ne": True}},
+            {"$set": {"inactive": True}}
+        )
+        return result.modified_count
+
+
+class StatsRepository:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self, pet_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"pet_id": pet_id})
+
+    async def create(self, stats_data: dict) -> None:
+        await self.collection.insert_one(stats_data)
+
+    async def update(self, pet_id: str, fields: dict) -> Optional[dict]:
+        """Set stat fields and return the updated document in one round-trip"""
+        return await self.collection.find_one_and_update(
+            {"pet_id": pet_id},
+            {"$set": fields},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def apply_deltas(self, pet_id: str, deltas: dict, fields: dict,
+                           decay: Optional[dict] = None) -> Optional[dict]:
+        """Atomically add deltas to stats (clamped to 0..100) and set fields.
+
+        Runs as a server-side pipeline update, so concurrent interactions
+        cannot overwrite each other's changes. A `decay` stage (see
+        decay_stage) is applied first when stats decay lazily.
+        """
+        pipeline = [{"$set": decay}] if decay else []
+        pipeline.append({"$set": delta_stage(deltas, fields)})
+        return await self.collection.find_one_and_update(
+            {"pet_id": pet_id},
+            pipeline,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def decay_stale(self, until: datetime, hourly: dict, stale_before: datetime) -> int:
+        """Materialize decay up to `until` in one bulk update, only for stats
+        last decayed (or, if never, last written) before `stale_before`"""
+        result = await self.collection.update_many(
+            stale_stats_query(stale_before),
+            [{"$set": decay_stage(until, hourly)}]
+        )
+        return result.modified_count
+
+
+class ChatRepository:
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def insert(self, chat_doc: dict) -> None:
+        await self.collection.insert_one(chat_doc)
+
+    async def insert_many(self, chat_docs: List[dict]) -> None:
+        """Unordered batch insert; chats already stored by an earlier,
+        partly failed attempt are skipped"""
+        try:
+            await self.collection.insert_many(chat_docs, ordered=False)
+        except BulkWriteError as e:
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+            if e.details.get("writeConcernErrors"):
+                raise
+
+    async def recent(self, pet_id: str, limit: int, sort_field: str = "timestamp",
+                     projection: Optional[dict] = None) -> List[dict]:
+        """Newest-first chats for a pet"""
+        cursor = self.collection.find({"pet_id": pet_id}, projection).sort(sort_field, -1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def page(self, pet_id: str, limit: int, before: Optional[Tuple[datetime, ObjectId]] = None,
+                   after: Optional[Tuple[datetime, ObjectId]] = None,
+                   projection: Optional[dict] = None) -> Tuple[List[dict], bool]:
+        """Keyset page of a pet's chats in chronological order.
+
+        `before`/`after` are (timestamp, _id) positions; without either the
+        newest page is returned. The flag tells whether more chats exist
+        beyond the page in the direction being read.
+        """
+        query = {"pet_id": pet_id}
+        if after is not None:
+            timestamp, chat_id = after
+            query["$or"] = [{"timestamp": {"$gt": timestamp}},
+                            {"timestamp": timestamp, "_id": {"$gt": chat_id}}]
+            direction = 1
+        else:
+            if before is not None:
+                timestamp, chat_id = before
+                query["$or"] = [{"timestamp": {"$lt": timestamp}},
+                                {"timestamp": timestamp, "_id": {"$lt": chat_id}}]
+            direction = -1
+
+        cursor = self.collection.find(query, projection).sort(
+            [("timestamp", direction), ("_id", direction)]
+        ).limit(limit + 1)
+        chats = await cursor.to_list(length=limit + 1)
+        has_more = len(chats) > limit
+        chats = chats[:limit]
+        if direction == -1:
+            chats.reverse()
+        return chats, has_more
+
+    async def scan(self, after_id: Optional[ObjectId] = None, batch_size: int = 1000,
+                   projection: Optional[dict] = None) -> List[dict]:
+        """One batch of all chats in _id order, resuming after `after_id`"""
+        query = {"_id": {"$gt": after_id}} if after_id is not None else {}
+        cursor = self.collection.find(query, projection).sort("_id", 1).limit(batch_size)
+        return await cursor.to_list(length=batch_size)
+
+    async def pets_before(self, cutoff: datetime) -> List[str]:
+        """Ids of the pets that have chats older than `cutoff`"""
+        return await self.collection.distinct("pet_id", {"timestamp": {"$lt": cutoff}})
+
+    async def get_many(self, chat_ids: List[ObjectId], projection: Optional[dict] = None) -> List[dict]:
+        """Chats by _id, in no particular order"""
+        if not chat_ids:
+            return []
+        cursor = self.collection.find({"_id": {"$in": chat_ids}}, projection)
+        return await cursor.to_list(length=len(chat_ids))
+
+    async def bulk_set(self, updates: List[Tuple[ObjectId, dict]]) -> int:
+        """Apply per-document $set updates in one unordered bulk write"""
+        if not updates:
+            return 0
+        result = await self.collection.bulk_write(
+            [UpdateOne({"_id": chat_id}, {"$set": fields}) for chat_id, fields in updates],
+            ordered=False
+        )
+        return result.modified_count
+
+    async def delete_many(self, chat_ids: List[ObjectId]) -> int:
+        if not chat_ids:
+            return 0
+        result = await self.collection.delete_many({"_id": {"$in": chat_ids}})
+        return result.deleted_count
+
+
+class ChatSegmentRepository:
+    """Archived chats of a pet, compacted into immutable segments.
+
+    A segment covers a contiguous run of a pet's chats, from the
+    (first_timestamp, first_id) position to (last_timestamp, last_id).
+    Segments never overlap and always precede the pet's remaining chats.
+    Only rescoring (rescore_chats.py) rewrites a stored segment.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def insert(self, segment_doc: dict) -> None:
+        await self.collection.insert_one(segment_doc)
+
+    async def get(self, segment_id: ObjectId, projection: Optional[dict] = None) -> Optional[dict]:
+        return await self.collection.find_one({"_id": segment_id}, projection)
+
+    async def update(self, segment_id: ObjectId, fields: dict) -> None:
+        await self.collection.update_one({"_id": segment_id}, {"$set": fields})
+
+    async def pet_ids(self) -> List[str]:
+        """Ids of the pets that have archived chats"""
+        return await self.collection.distinct("pet_id")
+
+    async def find_first(self, pet_id: str, first: Tuple[datetime, ObjectId],
+                         projection: Optional[dict] = None) -> Optional[dict]:
+        """The segment starting at chat position `first`"""
+        timestamp, chat_id = first
+        return await self.collection.find_one(
+            {"pet_id": pet_id, "first_timestamp": timestamp, "first_id": chat_id}, projection
+        )
+
+    async def before(self, pet_id: str, position: Optional[Tuple[datetime, ObjectId]], limit: int,
+                     projection: Optional[dict] = None) -> List[dict]:
+        """Segments holding chats older than `position` (all without one), newest first"""
+        query = {"pet_id": pet_id}
+        if position is not None:
+            timestamp, chat_id = position
+            query["$or"] = [{"first_timestamp": {"$lt": timestamp}},
+                            {"first_timestamp": timestamp, "first_id": {"$lt": chat_id}}]
+        cursor = self.collection.find(query, projection).sort(
+            [("first_timestamp", -1), ("first_id", -1)]
+        ).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def after(self, pet_id: str, position: Tuple[datetime, ObjectId], limit: int,
+                    projection: Optional[dict] = None) -> List[dict]:
+        """Segments holding chats newer than `position`, oldest first"""
+        timestamp, chat_id = position
+        query = {"pet_id": pet_id,
+                 "$or": [{"last_timestamp": {"$gt": timestamp}},
+                         {"last_timestamp": timestamp, "last_id": {"$gt": chat_id}}]}
+        cursor = self.collection.find(query, projection).sort(
+            [("first_timestamp", 1), ("first_id", 1)]
+        ).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def for_pet(self, pet_id: str, projection: Optional[dict] = None) -> List[dict]:
+        """All of a pet's segments, oldest first"""
+        cursor = self.collection.find({"pet_id": pet_id}, projection).sort(
+            [("first_timestamp", 1), ("first_id", 1)]
+        )
+        return await cursor.to_list(length=None)
+
+
+class JobRepository:
+    """Run bookkeeping for periodic jobs shared by all server processes"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def claim(self, name: str, interval: timedelta, now: datetime) -> Optional[datetime]:
+        """Atomically claim a run of a periodic job.
+
+        Returns the time of the previous run (or `now - interval` for the
+        first one) when the job is due, or None when another process ran
+        it less than `interval` ago.
+        """
+        try:
+            previous = await self.collection.find_one_and_update(
+                {"_id": name, "last_run_at": {"$lte": now - interval}},
+                {"$set": {"last_run_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            return None
+        return previous["last_run_at"] if previous else now - interval
+
+
+# Database
+class Database:
+    """Pooled async Mongo client and the repositories built on top of it.
+
+    The client is created in `connect()` rather than at import time so that
+    it is bound to the running event loop of the serving process.
+    """
+
+    def __init__(self, url: Optional[str] = None, name: str = "mia_db", **pool_options):
+        self.url = url
+        self.name = name
+        self.pool_options = pool_options
+        self.client = None
+        self.db = None
+        self.users = None
+        self.pets = None
+        self.stats = None
+        self.chats = None
+        self.segments = None
+        self.jobs = None
+
+    @classmethod
+    def from_env(cls) -> "Database":
+        return cls(
+            os.getenv("MONGO_URL"),
+            os.getenv("MONGO_DB_NAME", "mia_db"),
+            maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+            minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+            maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+            waitQueueTimeoutMS=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")),
+            serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+        )
+
+    def connect(self) -> None:
+        self.client = AsyncIOMotorClient(self.url, **self.pool_options)
+        self.db = self.client[self.name]
+        self.users = UserRepository(self.db["users"])
+        self.pets = PetRepository(self.db["pets"])
+        self.stats = StatsRepository(self.db["stats"])
+        self.chats = ChatRepository(self.db["chats"])
+        self.segments = ChatSegmentRepository(self.db["chat_segments"])
+        self.jobs = JobRepository(self.db["jobs"])
+
+    async def ensure_indexes(self) -> None:
+        await ensure_indexes(self.db)
+
+    def close(self) -> None:
+        if self.client is not None:
+            self.client.close()
+            self.client = None
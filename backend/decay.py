@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import math
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from database import EPOCH, STAT_DEFAULT, STAT_MAX, STAT_MIN
+
+logger = logging.getLogger(__name__)
+
+# Stat change per hour while a pet is left alone: it gets hungrier, rests
+# and slowly misses its owner
+HOURLY_DECAY = {
+    "hunger": float(os.getenv("STAT_DECAY_HUNGER_PER_HOUR", "3")),
+    "energy": float(os.getenv("STAT_DECAY_ENERGY_PER_HOUR", "2")),
+    "affection": float(os.getenv("STAT_DECAY_AFFECTION_PER_HOUR", "-1")),
+}
+
+
+def decay_deltas(since: datetime, until: datetime, hourly: dict = HOURLY_DECAY) -> dict:
+    """Whole-point stat changes accumulated between two instants.
+
+    Uses the difference of floor(rate * hours since epoch) at both ends, so
+    splitting a period into any number of runs adds up to the same total
+    and fractional rates are never rounded away.
+    """
+    start = (since - EPOCH) / timedelta(hours=1)
+    end = (until - EPOCH) / timedelta(hours=1)
+    deltas = {}
+    for field, rate in hourly.items():
+        steps = math.floor(abs(rate) * end) - math.floor(abs(rate) * start)
+        if steps:
+            deltas[field] = int(math.copysign(steps, rate))
+    return deltas
+
+
+def decay_step(hourly: dict = HOURLY_DECAY) -> Optional[timedelta]:
+    """Shortest time in which any stat can move by a whole point"""
+    fastest = max((abs(rate) for rate in hourly.values()), default=0)
+    return timedelta(hours=1 / fastest) if fastest else None
+
+
+def current_stats(stats: dict, now: datetime, hourly: dict = HOURLY_DECAY) -> dict:
+    """Stats with decay since they were last written applied, without storing it.
+
+    Mirrors database.decay_stage, which persists the same values on the
+    pet's next write.
+    """
+    since = stats.get("decayed_at") or stats.get("updated_at")
+    if since is None or since >= now:
+        return stats
+    current = dict(stats)
+    deltas = decay_deltas(since, now, hourly)
+    # Every decaying field is set, as decay_stage does, even if it has not moved yet
+    for field, rate in hourly.items():
+        if rate:
+            current[field] = max(STAT_MIN, min(STAT_MAX, current.get(field, STAT_DEFAULT) + deltas.get(field, 0)))
+    return current
+
+
+class DecayScheduler:
+    """Background task applying stat decay and inactivity flags in bulk.
+
+    Every `poll_interval` seconds it tries to claim the decay job (only
+    with `apply_decay`, i.e. when stats are not decayed lazily on read)
+    and the inactivity job; a claim only succeeds once per job interval
+    across all server processes, so decay is applied exactly once no
+    matter how many workers run. Missed time (e.g. while the server was
+    down) is caught up on the next run.
+    """
+
+    def __init__(self, database, decay_interval: float, inactive_check_interval: float,
+                 inactive_after: timedelta, apply_decay: bool = True, poll_interval: float = 60):
+        self.database = database
+        self.apply_decay = apply_decay
+        self.decay_interval = timedelta(seconds=decay_interval)
+        self.inactive_check_interval = timedelta(seconds=inactive_check_interval)
+        self.inactive_after = inactive_after
+        self.poll_interval = poll_interval
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Pet decay run failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def run_once(self, now: datetime = None) -> None:
+        now = now or datetime.utcnow()
+
+        previous = None
+        if self.apply_decay:
+            previous = await self.database.jobs.claim("stat_decay", self.decay_interval, now)
+        step = decay_step()
+        if previous is not None and step is not None:
+            # Stats decayed or written within the last step are left for a
+            # later run; each document tracks its own decayed_at, so nothing
+            # is lost by skipping it
+            updated = await self.database.stats.decay_stale(now, HOURLY_DECAY, now - step)
+            if updated:
+                logger.info("Applied stat decay to %d pets", updated)
+
+        previous = await self.database.jobs.claim("inactive_flags", self.inactive_check_interval, now)
+        if previous is not None:
+            flagged = await self.database.pets.flag_inactive(now - self.inactive_after)
+            if flagged:
+                logger.info("Flagged %d pets as inactive", flagged)
@@ -0,0 +1,38 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+from serialization import ORJSONResponse
+
+# Dynamic resources may be stored but must be revalidated before reuse
+REVALIDATE = "private, no-cache"
+
+
+def make_etag(*version: Any) -> str:
+    """Weak ETag for a resource identified by its version fields.
+
+    Versions are small tuples (ids, timestamps, counters) rather than the
+    payload itself, so the tag is known before anything is encoded.
+    """
+    digest = hashlib.blake2b(repr(version).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+
+def conditional_response(request: Request, etag: str, content: Any,
+                         cache_control: str = REVALIDATE) -> Response:
+    """304 when the client already holds `etag`, otherwise `content` as JSON"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(content, headers=headers)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Declared MongoDB indexes for the MIA backend.
+
+`ensure_indexes` is run on server startup and is idempotent. Run this file
+to report missing, undeclared and unused indexes plus the query plan of
+each endpoint's query:
+
+    python indexes.py report [--pet-id <id>]
+    python indexes.py ensure
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# collection -> indexes the queries in server.py rely on
+INDEX_CATALOG = {
+    "users": [
+        IndexModel([("user_id", 1)], name="user_id", unique=True),
+    ],
+    "pets": [
+        IndexModel([("user_id", 1)], name="user_id"),
+        IndexModel([("last_interaction", 1)], name="last_interaction"),
+    ],
+    "chats": [
+        IndexModel([("pet_id", 1), ("timestamp", -1), ("_id", -1)], name="pet_id_timestamp"),
+    ],
+    "chat_segments": [
+        IndexModel([("pet_id", 1), ("first_timestamp", 1), ("first_id", 1)], name="pet_id_first", unique=True),
+    ],
+    "stats": [
+        IndexModel([("pet_id", 1)], name="pet_id", unique=True),
+        IndexModel([("decayed_at", 1)], name="decayed_at"),
+        IndexModel([("updated_at", 1)], name="updated_at"),
+    ],
+}
+
+
+async def ensure_indexes(db) -> None:
+    """Create every catalog index that does not exist yet"""
+    for collection_name, models in INDEX_CATALOG.items():
+        try:
+            await db[collection_name].create_indexes(models)
+        except OperationFailure as e:
+            # e.g. duplicate pet_id stats documents blocking a unique index;
+            # the server still starts, `report` shows the index as missing
+            logger.error("Could not create indexes on %s: %s", collection_name, e)
+
+
+def endpoint_queries(pet_id: str, user_id: str):
+    """(endpoint, collection, filter, projection, sort, limit) for each hot
+    query, built from the limits and projections the server uses"""
+    from archive import SEGMENT_BOUNDS
+    from context import CONTEXT_PROJECTION, context_history_limit
+    from database import HISTORY_PAGE_SIZE, HISTORY_PROJECTION, stale_stats_query
+    from decay import decay_step
+
+    now = datetime.utcnow()
+    queries = [
+        ("GET /api/pet/{id}", "pets", {"_id": ObjectId(pet_id)}, None, None, 1),
+        ("GET /api/stats/{id}", "stats", {"pet_id": pet_id}, None, None, 1),
+        # ChatRepository.recent
+        ("POST /api/chat (context)", "chats", {"pet_id": pet_id}, CONTEXT_PROJECTION,
+         [("timestamp", -1)], context_history_limit()),
+        # ChatRepository.page reads one chat more than the page to set has_more
+        ("GET /api/chat/history/{id}", "chats",
+         {"pet_id": pet_id, "$or": [{"timestamp": {"$lt": now}},
+                                    {"timestamp": now, "_id": {"$lt": ObjectId()}}]},
+         HISTORY_PROJECTION, [("timestamp", -1), ("_id", -1)], HISTORY_PAGE_SIZE + 1),
+        ("GET /api/chat/history/{id} (archive)", "chat_segments",
+         {"pet_id": pet_id, "$or": [{"first_timestamp": {"$lt": now}},
+                                    {"first_timestamp": now, "first_id": {"$lt": ObjectId()}}]},
+         SEGMENT_BOUNDS, [("first_timestamp", -1), ("first_id", -1)], 1),
+        ("pets by user", "pets", {"user_id": user_id}, None, None, 0),
+        ("inactive pets", "pets", {"last_interaction": {"$lt": now - timedelta(hours=24)}}, None, None, 0),
+    ]
+    step = decay_step()
+    if step is not None:
+        queries.append(("stat decay", "stats", stale_stats_query(now - step), None, None, 0))
+    return queries
+
+
+def summarize_plan(plan: dict) -> str:
+    """Stage chain of a winning plan, e.g. FETCH <- IXSCAN(pet_id_timestamp)"""
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if "indexName" in plan:
+            stage += f"({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return " <- ".join(stages)
+
+
+async def report(db, pet_id: str = None) -> None:
+    print("Indexes")
+    for collection_name, models in INDEX_CATALOG.items():
+        collection = db[collection_name]
+        existing = {index["name"] async for index in collection.list_indexes()}
+        declared = {model.document["name"] for model in models}
+        usage = {}
+        async for stat in collection.aggregate([{"$indexStats": {}}]):
+            usage[stat["name"]] = stat["accesses"]["ops"]
+
+        print(f"  {collection_name}:")
+        for name in sorted(declared - existing):
+            print(f"    MISSING    {name}")
+        for name in sorted(existing - declared - {"_id_"}):
+            print(f"    UNDECLARED {name} (ops={usage.get(name, 0)})")
+        for name in sorted(existing & (declared | {"_id_"})):
+            ops = usage.get(name, 0)
+            print(f"    {'UNUSED' if ops == 0 else 'ok':<10} {name} (ops={ops})")
+
+    if pet_id is None:
+        pet = await db["pets"].find_one({}, {"_id": 1, "user_id": 1})
+        if pet is None:
+            print("\nNo pets found; pass --pet-id to explain endpoint queries")
+            return
+        pet_id, user_id = str(pet["_id"]), pet.get("user_id", "")
+    else:
+        pet = await db["pets"].find_one({"_id": ObjectId(pet_id)}, {"user_id": 1}) or {}
+        user_id = pet.get("user_id", "")
+
+    print(f"\nQuery plans (pet_id={pet_id})")
+    for endpoint, collection_name, query, projection, sort, limit in endpoint_queries(pet_id, user_id):
+        cursor = db[collection_name].find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        explain = await cursor.explain()
+        plan = summarize_plan(explain["queryPlanner"]["winningPlan"])
+        stats = explain.get("executionStats", {})
+        print(f"  {endpoint:<30} {plan}")
+        if stats:
+            print(f"  {'':<30} keysExamined={stats.get('totalKeysExamined')} "
+                  f"docsExamined={stats.get('totalDocsExamined')} returned={stats.get('nReturned')}")
+
+
+async def run(args) -> None:
+    from database import Database
+
+    database = Database.from_env()
+    database.connect()
+    try:
+        if args.command == "ensure":
+            await ensure_indexes(database.db)
+            print("Indexes ensured")
+        else:
+            await report(database.db, args.pet_id)
+    finally:
+        database.close()
+
+
+def main():
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Manage and inspect MIA MongoDB indexes")
+    parser.add_argument("command", choices=["report", "ensure"])
+    parser.add_argument("--pet-id", help="pet used to explain endpoint queries (default: any pet)")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
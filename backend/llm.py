@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional
+
+import httpx
+
+from context import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class LLMResult:
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class LLMProvider:
+    """Chat completion backend used by the chat endpoints"""
+
+    name = "base"
+
+    async def complete(self, messages: List[dict], max_tokens: int) -> LLMResult:
+        raise NotImplementedError
+
+    async def stream(self, messages: List[dict], max_tokens: int) -> AsyncIterator[str]:
+        """Yield reply text chunks; providers without streaming yield once"""
+        result = await self.complete(messages, max_tokens)
+        yield result.text
+
+    async def close(self) -> None:
+        pass
+
+
+class LLMNotConfigured(RuntimeError):
+    pass
+
+
+class UnconfiguredProvider(LLMProvider):
+    """Stand-in when the selected provider has no credentials: every call
+    fails, so the chat endpoints answer with their fallback reply"""
+
+    name = "unconfigured"
+
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    async def complete(self, messages: List[dict], max_tokens: int) -> LLMResult:
+        raise LLMNotConfigured(self.reason)
+
+
+class OpenAIProvider(LLMProvider):
+    name = "openai"
+
+    def __init__(self, api_key: Optional[str], model: str, http_client: httpx.AsyncClient,
+                 base_url: Optional[str] = None):
+        from openai import AsyncOpenAI
+
+        self.model = model
+        self.http_client = http_client
+        # Retries are left to the caller so timeouts stay predictable
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+    async def complete(self, messages: List[dict], max_tokens: int) -> LLMResult:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens
+        )
+        usage = response.usage
+        return LLMResult(
+            text=response.choices[0].message.content or "",
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0
+        )
+
+    async def stream(self, messages: List[dict], max_tokens: int) -> AsyncIterator[str]:
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def close(self) -> None:
+        await self.http_client.aclose()
+
+
+class EmergentProvider(LLMProvider):
+    """Emergent universal key via emergentintegrations' LlmChat.
+
+    LlmChat manages its own HTTP client, so the shared pool does not apply.
+    """
+
+    name = "emergent"
+
+    def __init__(self, api_key: Optional[str], provider: str, model: str):
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+        self._llm_chat = LlmChat
+        self._user_message = UserMessage
+        self.api_key = api_key
+        self.provider = provider
+        self.model = model
+
+    async def complete(self, messages: List[dict], max_tokens: int) -> LLMResult:
+        # LlmChat keeps history per instance, so earlier turns ride along in
+        # the system message of a one-off session
+        system_parts = [m["content"] for m in messages if m["role"] == "system"]
+        transcript = "\n".join(
+            f"{'Owner' if m['role'] == 'user' else 'You'}: {m['content']}"
+            for m in messages[:-1] if m["role"] != "system"
+        )
+        if transcript:
+            system_parts.append(f"Recent conversation:\n{transcript}")
+        chat = self._llm_chat(
+            api_key=self.api_key,
+            session_id=f"mia_{uuid.uuid4().hex}",
+            system_message="\n\n".join(system_parts)
+        ).with_model(self.provider, self.model)
+        text = await chat.send_message(self._user_message(text=messages[-1]["content"]))
+        return LLMResult(
+            text=text,
+            prompt_tokens=sum(estimate_tokens(m["content"]) for m in messages),
+            completion_tokens=estimate_tokens(text)
+        )
+
+
+class FakeProvider(LLMProvider):
+    """Deterministic local stand-in for load tests and offline development.
+
+    Replies are picked from `responses` by a hash of the conversation, so the
+    same input always gets the same reply. Templates may use {message} and
+    {name}. `latency` seconds are spent before the first token and
+    `token_latency` between streamed words.
+    """
+
+    name = "fake"
+
+    DEFAULT_RESPONSES = [
+        "Yay, you're here! I was just thinking about you. 💕",
+        "Ooh, tell me more about \"{message}\"! I'm all ears.",
+        "Hehe, that makes me so happy! Let's keep talking!",
+        "Hmm, I'm listening... you always have interesting things to say.",
+    ]
+
+    def __init__(self, responses: Optional[List[str]] = None, latency: float = 0.0, token_latency: float = 0.0):
+        self.responses = responses or self.DEFAULT_RESPONSES
+        self.latency = latency
+        self.token_latency = token_latency
+
+    def _reply(self, messages: List[dict]) -> str:
+        message = messages[-1]["content"]
+        digest = hashlib.sha1(json.dumps(messages, sort_keys=True).encode()).digest()
+        template = self.responses[int.from_bytes(digest[:4], "big") % len(self.responses)]
+        name = messages[0]["content"].removeprefix("You are ").split(",", 1)[0] if messages else "MIA"
+        return template.replace("{message}", message[:60]).replace("{name}", name)
+
+    async def complete(self, messages: List[dict], max_tokens: int) -> LLMResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self._reply(messages)
+        return LLMResult(
+            text=text,
+            prompt_tokens=sum(estimate_tokens(m["content"]) for m in messages),
+            completion_tokens=estimate_tokens(text)
+        )
+
+    async def stream(self, messages: List[dict], max_tokens: int) -> AsyncIterator[str]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        words = self._reply(messages).split(" ")
+        for i, word in enumerate(words):
+            if i and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield word if i == 0 else f" {word}"
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Whether an LLM call failed in a way worth retrying"""
+    if isinstance(exc, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status == 429 or status >= 500
+    # openai.APIConnectionError / APITimeoutError carry no status code
+    return type(exc).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def create_provider(name: Optional[str] = None) -> LLMProvider:
+    """Build the provider selected by LLM_PROVIDER (openai, emergent or fake)"""
+    name = (name or os.getenv("LLM_PROVIDER", "openai")).lower()
+    model = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+
+    if name == "openai":
+        if not os.getenv("OPENAI_API_KEY"):
+            logger.warning("LLM_PROVIDER=openai without OPENAI_API_KEY; chats get the fallback reply")
+            return UnconfiguredProvider("OPENAI_API_KEY is not set")
+        timeout = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+                max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+            ),
+            timeout=httpx.Timeout(timeout, connect=float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5")))
+        )
+        return OpenAIProvider(os.getenv("OPENAI_API_KEY"), model, http_client, os.getenv("LLM_BASE_URL"))
+    if name == "emergent":
+        return EmergentProvider(
+            os.getenv("EMERGENT_LLM_KEY"),
+            os.getenv("LLM_UPSTREAM_PROVIDER", "openai"),
+            os.getenv("LLM_MODEL", "gpt-4o")
+        )
+    if name == "fake":
+        responses = None
+        responses_file = os.getenv("LLM_FAKE_RESPONSES_FILE")
+        if responses_file:
+            with open(responses_file) as f:
+                responses = json.load(f)
+        return FakeProvider(
+            responses,
+            latency=float(os.getenv("LLM_FAKE_LATENCY_MS", "0")) / 1000,
+            token_latency=float(os.getenv("LLM_FAKE_TOKEN_LATENCY_MS", "0")) / 1000
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER: {name}")
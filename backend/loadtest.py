@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the MIA backend.
+
+Boots server.py in-process against in-memory repositories and the fake LLM
+provider, drives concurrent users through create -> chat -> history ->
+stats over an async ASGI client and reports latency percentiles and
+throughput per endpoint. Pass --url to drive a running server instead.
+
+    python loadtest.py --users 50 --chats 10 --output results.json
+    python loadtest.py --compare baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from bson import ObjectId
+
+from archive import project
+from database import STAT_DEFAULT, STAT_MAX, STAT_MIN
+from decay import current_stats
+
+MESSAGES = [
+    "Hi! How are you today?",
+    "I had a great day at work, I'm so happy",
+    "I feel a bit lonely tonight",
+    "What should we do this weekend?",
+    "Tell me something nice",
+    "I love spending time with you",
+]
+
+
+# In-memory stand-ins for the repositories in database.py
+class InMemoryPets:
+    def __init__(self):
+        self.docs = {}
+
+    async def get(self, pet_id: str, projection: Optional[dict] = None) -> Optional[dict]:
+        doc = self.docs.get(pet_id)
+        return dict(doc) if doc else None
+
+    async def create(self, pet_data: dict) -> str:
+        pet_data["_id"] = ObjectId()
+        self.docs[str(pet_data["_id"])] = dict(pet_data)
+        return str(pet_data["_id"])
+
+    async def update(self, pet_id: str, fields: dict) -> None:
+        doc = self.docs.get(pet_id)
+        if doc:
+            doc.update(fields)
+
+    async def touch(self, pet_id: str, when: datetime) -> None:
+        await self.touch_many({pet_id: when})
+
+    async def touch_many(self, touches: Dict[str, datetime]) -> int:
+        for pet_id, when in touches.items():
+            doc = self.docs.get(pet_id)
+            if doc:
+                doc["last_interaction"] = max(when, doc.get("last_interaction", when))
+                doc["inactive"] = False
+        return len(touches)
+
+    async def flag_inactive(self, cutoff: datetime) -> int:
+        return 0
+
+
+class InMemoryStats:
+    def __init__(self):
+        self.docs = {}
+
+    async def get(self, pet_id: str) -> Optional[dict]:
+        doc = self.docs.get(pet_id)
+        return dict(doc) if doc else None
+
+    async def create(self, stats_data: dict) -> None:
+        stats_data["_id"] = ObjectId()
+        self.docs[stats_data["pet_id"]] = dict(stats_data)
+
+    async def update(self, pet_id: str, fields: dict) -> Optional[dict]:
+        doc = self.docs.get(pet_id)
+        if doc is None:
+            return None
+        doc.update(fields)
+        return dict(doc)
+
+    async def apply_deltas(self, pet_id: str, deltas: dict, fields: dict,
+                           decay: Optional[dict] = None) -> Optional[dict]:
+        doc = self.docs.get(pet_id)
+        if doc is None:
+            return None
+        if decay:
+            now = datetime.utcnow()
+            doc.update(current_stats(doc, now), decayed_at=now)
+        for field, delta in deltas.items():
+            doc[field] = max(STAT_MIN, min(STAT_MAX, doc.get(field, STAT_DEFAULT) + delta))
+        doc.update(fields)
+        return dict(doc)
+
+    async def decay_stale(self, until: datetime, hourly: dict, stale_before: datetime) -> int:
+        stale = [doc for doc in self.docs.values()
+                 if (doc.get("decayed_at") or doc.get("updated_at") or until) < stale_before]
+        for doc in stale:
+            doc.update(current_stats(doc, until, hourly), decayed_at=until)
+        return len(stale)
+
+
+class InMemoryChats:
+    def __init__(self):
+        self.by_pet = defaultdict(list)
+
+    async def insert(self, chat_doc: dict) -> None:
+        chat_doc.setdefault("_id", ObjectId())
+        chats = self.by_pet[chat_doc["pet_id"]]
+        chats.append(dict(chat_doc))
+        chats.sort(key=lambda chat: (chat["timestamp"], chat["_id"]))
+
+    async def insert_many(self, chat_docs: List[dict]) -> None:
+        for chat_doc in chat_docs:
+            await self.insert(chat_doc)
+
+    async def recent(self, pet_id: str, limit: int, sort_field: str = "timestamp",
+                     projection: Optional[dict] = None) -> List[dict]:
+        return [project(chat, projection) for chat in reversed(self.by_pet.get(pet_id, [])[-limit:])]
+
+    async def page(self, pet_id: str, limit: int, before: Optional[Tuple[datetime, ObjectId]] = None,
+                   after: Optional[Tuple[datetime, ObjectId]] = None,
+                   projection: Optional[dict] = None) -> Tuple[List[dict], bool]:
+        chats = self.by_pet.get(pet_id, [])
+        if after is not None:
+            newer = [chat for chat in chats if (chat["timestamp"], chat["_id"]) > after]
+            return [project(chat, projection) for chat in newer[:limit]], len(newer) > limit
+        if before is not None:
+            chats = [chat for chat in chats if (chat["timestamp"], chat["_id"]) < before]
+        return [project(chat, projection) for chat in chats[-limit:]], len(chats) > limit
+
+    async def pets_before(self, cutoff: datetime) -> List[str]:
+        return [pet_id for pet_id, chats in self.by_pet.items() if chats and chats[0]["timestamp"] < cutoff]
+
+    async def get_many(self, chat_ids: List[ObjectId], projection: Optional[dict] = None) -> List[dict]:
+        wanted = set(chat_ids)
+        return [project(chat, projection) for chats in self.by_pet.values() for chat in chats
+                if chat["_id"] in wanted]
+
+    async def bulk_set(self, updates: List[Tuple[ObjectId, dict]]) -> int:
+        fields = dict(updates)
+        for chats in self.by_pet.values():
+            for chat in chats:
+                chat.update(fields.get(chat["_id"], {}))
+        return len(updates)
+
+    async def delete_many(self, chat_ids: List[ObjectId]) -> int:
+        wanted = set(chat_ids)
+        deleted = 0
+        for pet_id, chats in self.by_pet.items():
+            kept = [chat for chat in chats if chat["_id"] not in wanted]
+            deleted += len(chats) - len(kept)
+            self.by_pet[pet_id] = kept
+        return deleted
+
+
+class InMemorySegments:
+    def __init__(self):
+        self.by_pet = defaultdict(list)
+
+    async def insert(self, segment_doc: dict) -> None:
+        segment_doc.setdefault("_id", ObjectId())
+        segments = self.by_pet[segment_doc["pet_id"]]
+        segments.append(dict(segment_doc))
+        segments.sort(key=lambda segment: (segment["first_timestamp"], segment["first_id"]))
+
+    async def get(self, segment_id: ObjectId, projection: Optional[dict] = None) -> Optional[dict]:
+        for segments in self.by_pet.values():
+            for segment in segments:
+                if segment["_id"] == segment_id:
+                    return dict(segment)
+        return None
+
+    async def find_first(self, pet_id: str, first: Tuple[datetime, ObjectId],
+                         projection: Optional[dict] = None) -> Optional[dict]:
+        return next((dict(segment) for segment in self.by_pet.get(pet_id, [])
+                     if (segment["first_timestamp"], segment["first_id"]) == first), None)
+
+    async def before(self, pet_id: str, position: Optional[Tuple[datetime, ObjectId]], limit: int,
+                     projection: Optional[dict] = None) -> List[dict]:
+        segments = [segment for segment in reversed(self.by_pet.get(pet_id, []))
+                    if position is None or (segment["first_timestamp"], segment["first_id"]) < position]
+        return [dict(segment) for segment in segments[:limit]]
+
+    async def after(self, pet_id: str, position: Tuple[datetime, ObjectId], limit: int,
+                    projection: Optional[dict] = None) -> List[dict]:
+        segments = [segment for segment in self.by_pet.get(pet_id, [])
+                    if (segment["last_timestamp"], segment["last_id"]) > position]
+        return [dict(segment) for segment in segments[:limit]]
+
+    async def for_pet(self, pet_id: str, projection: Optional[dict] = None) -> List[dict]:
+        return [dict(segment) for segment in self.by_pet.get(pet_id, [])]
+
+    async def update(self, segment_id: ObjectId, fields: dict) -> None:
+        for segments in self.by_pet.values():
+            for segment in segments:
+                if segment["_id"] == segment_id:
+                    segment.update(fields)
+
+    async def pet_ids(self) -> List[str]:
+        return [pet_id for pet_id, segments in self.by_pet.items() if segments]
+
+
+class InMemoryJobs:
+    def __init__(self):
+        self.last_run = {}
+
+    async def claim(self, name: str, interval: timedelta, now: datetime) -> Optional[datetime]:
+        previous = self.last_run.get(name, now - interval)
+        if now - previous < interval:
+            return None
+        self.last_run[name] = now
+        return previous
+
+
+class InMemoryDatabase:
+    """Drop-in for database.Database with no Mongo server"""
+
+    def __init__(self):
+        self.pets = InMemoryPets()
+        self.stats = InMemoryStats()
+        self.chats = InMemoryChats()
+        self.segments = InMemorySegments()
+        self.jobs = InMemoryJobs()
+
+    def connect(self) -> None:
+        pass
+
+    async def ensure_indexes(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+# Measurement
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.errors[endpoint] += 1
+            return None
+        self.latencies[endpoint].append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+            return None
+        return response.json()
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            samples = sorted(self.latencies[endpoint])
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": self.errors[endpoint],
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "mean_ms": round(1000 * sum(samples) / len(samples), 2) if samples else None,
+                "p50_ms": percentile(samples, 50),
+                "p95_ms": percentile(samples, 95),
+                "p99_ms": percentile(samples, 99),
+                "max_ms": round(1000 * samples[-1], 2) if samples else None,
+            }
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {"elapsed_seconds": round(elapsed, 3), "requests": total,
+                "throughput_rps": round(total / elapsed, 2), "endpoints": endpoints}
+
+
+def percentile(sorted_samples: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile in milliseconds"""
+    if not sorted_samples:
+        return None
+    rank = max(1, -(-len(sorted_samples) * p // 100))
+    return round(1000 * sorted_samples[int(rank) - 1], 2)
+
+
+async def user_session(client: httpx.AsyncClient, recorder: Recorder, user: int, args, rng: random.Random):
+    if args.think_ms:
+        await asyncio.sleep(rng.uniform(0, args.think_ms) / 1000)
+    created = await recorder.call(client, "POST /api/pet/create", "POST", "/api/pet/create", json={
+        "user_id": f"loadtest-{user}",
+        "name": f"Pet{user}",
+        "personality_type": "predefined",
+        "personality_id": rng.choice(["cheerful", "shy", "adventurous", "calm"]),
+    })
+    if not created:
+        return
+    pet_id = created["pet"]["_id"]
+
+    for _ in range(args.chats):
+        await recorder.call(client, "POST /api/chat", "POST", "/api/chat",
+                            json={"pet_id": pet_id, "message": rng.choice(MESSAGES)})
+        if args.think_ms:
+            await asyncio.sleep(rng.uniform(0, args.think_ms) / 1000)
+
+    await recorder.call(client, "GET /api/chat/history/{id}", "GET",
+                        f"/api/chat/history/{pet_id}", params={"limit": args.history_limit})
+    await recorder.call(client, "GET /api/stats/{id}", "GET", f"/api/stats/{pet_id}")
+
+
+async def drive(client: httpx.AsyncClient, args) -> dict:
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        user_session(client, recorder, user, args, random.Random(rng.random()))
+        for user in range(args.users)
+    ))
+    return recorder.report(time.perf_counter() - started)
+
+
+async def run(args) -> dict:
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout) as client:
+            return await drive(client, args)
+
+    # Configure the app before import: fake LLM, no background jobs
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["LLM_FAKE_LATENCY_MS"] = str(args.llm_latency_ms)
+    os.environ.setdefault("PET_DECAY_SCHEDULER", "false")
+    # All virtual users share one client address
+    os.environ.setdefault("RATE_LIMITS", "false")
+    os.environ.setdefault("MONGO_URL", "mongodb://loadtest.invalid:27017")
+    os.environ.setdefault("MONGO_DB_NAME", "loadtest")
+    import server
+
+    server.database = InMemoryDatabase()
+    for component in (server.decay_scheduler, server.write_buffer, server.memory,
+                      server.chat_archive, server.archiver):
+        if component is not None:
+            component.database = server.database
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest",
+                                     timeout=args.timeout) as client:
+            return await drive(client, args)
+
+
+def print_report(result: dict, baseline: Optional[dict] = None) -> None:
+    print(f"{result['requests']} requests in {result['elapsed_seconds']}s "
+          f"({result['throughput_rps']} req/s)")
+    header = f"{'endpoint':<28} {'reqs':>6} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    if baseline:
+        header += f" {'p95 vs base':>12}"
+    print(header)
+    for endpoint, stats in result["endpoints"].items():
+        line = (f"{endpoint:<28} {stats['requests']:>6} {stats['errors']:>4} {stats['throughput_rps']:>8} "
+                f"{stats['p50_ms'] or 0:>8} {stats['p95_ms'] or 0:>8} {stats['p99_ms'] or 0:>8}")
+        base = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if base and base.get("p95_ms") and stats["p95_ms"]:
+            line += f" {100 * (stats['p95_ms'] / base['p95_ms'] - 1):>+11.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the MIA backend")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--chats", type=int, default=5, help="chat messages per user")
+    parser.add_argument("--history-limit", type=int, default=20)
+    parser.add_argument("--think-ms", type=float, default=0, help="max random pause between steps")
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="fake LLM reply latency")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="drive a running server instead of booting one in-process")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline results JSON to compare p95 against")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    result["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "compare")}
+    result["finished_at"] = datetime.utcnow().isoformat()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+import asyncio
+import bisect
+import logging
+import re
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from database import ORIGIN
+
+logger = logging.getLogger(__name__)
+
+WORD_PATTERN = re.compile(r"\w+")
+
+RECALL_FIELDS = ("user_message", "ai_response", "timestamp")
+
+MIN_CAPACITY = 8
+# Rows converted to float32 at a time while searching
+SEARCH_BLOCK_ROWS = 4096
+
+RECALL_PROJECTION = {field: 1 for field in RECALL_FIELDS}
+SEGMENT_VECTORS = {"embeddings": 1, "count": 1, "last_timestamp": 1, "last_id": 1}
+
+
+def exchange_text(chat: dict) -> str:
+    return f"{chat.get('user_message') or ''}\n{chat.get('ai_response') or ''}"
+
+
+class HashingEmbedder:
+    """Local text embedding by feature hashing, no model or network.
+
+    Words, word bigrams and character trigrams are hashed (crc32, stable
+    across processes) into `dim` signed buckets and the vector is L2
+    normalised, so a dot product is the cosine similarity of the two
+    texts' surface features. Vectors are stored as float16.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def features(self, text: str) -> List[str]:
+        words = WORD_PATTERN.findall(text.lower())
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        for word in words:
+            padded = f"<{word}>"
+            features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        hashes = np.fromiter((zlib.crc32(f.encode()) for f in self.features(text)), dtype=np.uint32)
+        if not len(hashes):
+            return np.zeros(self.dim, dtype=np.float32)
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+        vector = np.bincount(hashes % self.dim, weights=signs, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def to_bytes(self, vector: np.ndarray) -> bytes:
+        return vector.astype(np.float16).tobytes()
+
+    def from_bytes(self, data: Optional[bytes]) -> Optional[np.ndarray]:
+        if not data or len(data) != self.dim * 2:
+            return None  # missing, or stored with another dimension
+        return np.frombuffer(data, dtype=np.float16)
+
+
+class PetMemoryIndex:
+    """Embeddings of one pet's chats in chronological order.
+
+    Vectors are held in float16, as stored. Appends grow the matrix by
+    doubling, so adding a chat is amortised O(1); search is a matrix-vector
+    product over float32 blocks plus a partial sort. The first `archived`
+    rows come from archive segments and are addressed by offset within
+    their segment rather than by chat id.
+    """
+
+    def __init__(self, dim: int, capacity: int = 0):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float16)
+        self.ids: List[Optional[ObjectId]] = []
+        # (first row, segment id) of the archived rows
+        self.segments: List[Tuple[int, ObjectId]] = []
+        self.archived = 0
+        self.last = ORIGIN
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, chat_id: Optional[ObjectId], vector: np.ndarray) -> None:
+        count = len(self.ids)
+        if count == len(self.vectors):
+            grown = np.zeros((max(MIN_CAPACITY, 2 * count), self.vectors.shape[1]), dtype=np.float16)
+            grown[:count] = self.vectors
+            self.vectors = grown
+        self.vectors[count] = vector
+        self.ids.append(chat_id)
+
+    def search(self, query: np.ndarray, k: int, skip_recent: int = 0) -> List[Tuple[int, float]]:
+        """Top `k` (row, cosine score), leaving out the newest `skip_recent`"""
+        count = len(self.ids) - skip_recent
+        if count <= 0 or k <= 0:
+            return []
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            block = self.vectors[start:min(start + SEARCH_BLOCK_ROWS, count)]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        k = min(k, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def locate(self, row: int) -> Tuple[ObjectId, int]:
+        """(segment id, index within the segment) of an archived row"""
+        i = bisect.bisect_right([first for first, _ in self.segments], row) - 1
+        first, segment_id = self.segments[i]
+        return segment_id, row - first
+
+
+class MemoryStore:
+    """Per-pet memory indexes for recalling relevant old exchanges.
+
+    Chats carry their embedding (see `embed_exchange`), so building a pet's
+    index reads only vectors, once per process. The build runs in a
+    background task and recalls return nothing until it is done; after
+    that each recall catches up with chats stored since (by this or any
+    other worker) in one indexed query. Chats stored before memory existed
+    are embedded and backfilled during the build. With an `archive`, the
+    vectors of archived chats are loaded from their segments first.
+    Indexes are evicted least recently used once more than `max_vectors`
+    rows are allocated in total (2 bytes per dimension each).
+    """
+
+    def __init__(self, database, embedder: HashingEmbedder, top_k: int = 3, min_score: float = 0.3,
+                 max_vectors: int = 200000, batch_size: int = 1000, archive=None):
+        self.database = database
+        self.embedder = embedder
+        self.archive = archive
+        self.top_k = top_k
+        self.min_score = min_score
+        self.max_vectors = max_vectors
+        self.batch_size = batch_size
+        self._indexes: "OrderedDict[str, PetMemoryIndex]" = OrderedDict()
+        self._syncs: Dict[str, asyncio.Task] = {}
+        self._rows = 0
+        self.recalls = 0
+        self.backfilled = 0
+
+    def embed_exchange(self, user_message: str, ai_response: str) -> bytes:
+        """Stored embedding for a new chat document"""
+        return self.embedder.to_bytes(self._vector({"user_message": user_message, "ai_response": ai_response}))
+
+    def _vector(self, chat: dict) -> np.ndarray:
+        return self.embedder.embed(exchange_text(chat))
+
+    async def recall(self, pet_id: str, message: str, skip_recent: int = 0) -> List[dict]:
+        """Old chats most similar to `message`, best first, skipping the
+        newest `skip_recent` (already in the prompt as recent history).
+        Empty while the pet's index is first being built."""
+        index = self._indexes.get(pet_id)
+        sync = self._start_sync(pet_id)
+        if index is None:
+            return []
+        # Cancelling the recall (caller timeout) leaves the catch-up running
+        await asyncio.shield(sync)
+        hits = index.search(self.embedder.embed(message), self.top_k, skip_recent)
+        hits = [(row, score) for row, score in hits if score >= self.min_score]
+        if not hits:
+            return []
+        self.recalls += 1
+        scored = []
+        hot = {index.ids[row]: score for row, score in hits if row >= index.archived}
+        if hot:
+            # A chat archived since the index was built is simply not found
+            chats = await self.database.chats.get_many(list(hot), RECALL_PROJECTION)
+            scored.extend((hot[chat["_id"]], chat) for chat in chats)
+        for row, score in hits:
+            if row < index.archived:
+                segment_id, offset = index.locate(row)
+                chats = await self.archive.segment_chats(segment_id)
+                if offset < len(chats):
+                    chat = chats[offset]
+                    scored.append((score, {"_id": chat["_id"], **{f: chat.get(f) for f in RECALL_FIELDS}}))
+        scored.sort(key=lambda item: -item[0])
+        return [chat for _, chat in scored]
+
+    def _start_sync(self, pet_id: str) -> asyncio.Task:
+        """The pet's running build or catch-up task, started if there is none"""
+        task = self._syncs.get(pet_id)
+        if task is None:
+            task = self._syncs[pet_id] = asyncio.create_task(self._sync(pet_id))
+            task.add_done_callback(lambda done: self._sync_done(pet_id, done))
+        return task
+
+    async def close(self) -> None:
+        """Cancel index builds still running"""
+        tasks = list(self._syncs.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _sync_done(self, pet_id: str, task: asyncio.Task) -> None:
+        if self._syncs.get(pet_id) is task:
+            del self._syncs[pet_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Memory index sync failed for pet %s: %r", pet_id, task.exception())
+
+    async def _sync(self, pet_id: str) -> None:
+        index = self._indexes.get(pet_id)
+        if index is None:
+            index = PetMemoryIndex(self.embedder.dim)
+            if self.archive is not None:
+                await self._load_segments(pet_id, index)
+            await self._catch_up(pet_id, index)
+            self._indexes[pet_id] = index
+            self._rows += len(index.vectors)
+        else:
+            self._indexes.move_to_end(pet_id)
+            allocated = len(index.vectors)
+            await self._catch_up(pet_id, index)
+            self._rows += len(index.vectors) - allocated
+        self._evict(keep=pet_id)
+
+    async def _load_segments(self, pet_id: str, index: PetMemoryIndex) -> None:
+        for segment in await self.database.segments.for_pet(pet_id, SEGMENT_VECTORS):
+            vectors = [self.embedder.from_bytes(data) for data in segment.get("embeddings") or []]
+            if len(vectors) != segment["count"] or any(vector is None for vector in vectors):
+                # Archived before memory existed, or embedded with another dimension
+                vectors = [self._vector(chat) for chat in await self.archive.segment_chats(segment["_id"])]
+            index.segments.append((len(index), segment["_id"]))
+            for vector in vectors:
+                index.append(None, vector)
+            index.last = (segment["last_timestamp"], segment["last_id"])
+        index.archived = len(index)
+
+    async def _catch_up(self, pet_id: str, index: PetMemoryIndex) -> None:
+        has_more = True
+        while has_more:
+            chats, has_more = await self.database.chats.page(
+                pet_id, self.batch_size, after=index.last, projection={"timestamp": 1, "embedding": 1}
+            )
+            if not chats:
+                return
+            missing = [chat["_id"] for chat in chats if self.embedder.from_bytes(chat.get("embedding")) is None]
+            backfill = await self._backfill(missing) if missing else {}
+            for chat in chats:
+                vector = backfill.get(chat["_id"])
+                if vector is None:
+                    vector = self.embedder.from_bytes(chat.get("embedding"))
+                index.append(chat["_id"], vector)
+            index.last = (chats[-1]["timestamp"], chats[-1]["_id"])
+
+    async def _backfill(self, chat_ids: List[ObjectId]) -> Dict[ObjectId, np.ndarray]:
+        """Embed chats stored without an embedding and save it on them"""
+        chats = await self.database.chats.get_many(chat_ids, {"user_message": 1, "ai_response": 1})
+        vectors, updates = {}, []
+        for chat in chats:
+            vector = self._vector(chat)
+            vectors[chat["_id"]] = vector
+            updates.append((chat["_id"], {"embedding": self.embedder.to_bytes(vector)}))
+        await self.database.chats.bulk_set(updates)
+        self.backfilled += len(updates)
+        # A chat deleted meanwhile still needs a placeholder row
+        return {chat_id: vectors.get(chat_id, np.zeros(self.embedder.dim, np.float32)) for chat_id in chat_ids}
+
+    def _evict(self, keep: str) -> None:
+        while self._rows > self.max_vectors and len(self._indexes) > 1:
+            pet_id = next(iter(self._indexes))
+            if pet_id == keep:
+                self._indexes.move_to_end(pet_id)
+                continue
+            if pet_id in self._syncs:
+                break  # catching up; evicted on a later pass
+            self._rows -= len(self._indexes.pop(pet_id).vectors)
+
+    def stats(self) -> dict:
+        return {
+            "pets": len(self._indexes),
+            "vectors": sum(len(index) for index in self._indexes.values()),
+            "allocated_rows": self._rows,
+            "recalls": self.recalls,
+            "backfilled": self.backfilled
+        }
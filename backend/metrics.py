@@ -0,0 +1,216 @@
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger("mia.timing")
+
+# Seconds; chat requests spend most of their time in the LLM
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30)
+
+REQUEST_LATENCY = Histogram(
+    "mia_http_request_duration_seconds", "HTTP request latency by route (streams: until the last byte)",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge("mia_http_requests_in_flight", "HTTP requests being served",
+                           multiprocess_mode="livesum")
+REQUEST_ERRORS = Counter(
+    "mia_http_request_errors_total", "Requests answered with a 5xx, by route and cause", ["route", "exception"]
+)
+MONGO_LATENCY = Histogram(
+    "mia_mongo_operation_duration_seconds", "Repository call latency", ["operation"], buckets=LATENCY_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    "mia_llm_call_duration_seconds", "LLM provider call latency", ["provider", "mode", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+LLM_FIRST_TOKEN = Histogram(
+    "mia_llm_first_token_seconds", "Time to the first streamed chunk", ["provider"], buckets=LATENCY_BUCKETS
+)
+LLM_TOKENS = Counter("mia_llm_tokens_total", "Tokens used (estimated for streams)", ["provider", "kind"])
+SENTIMENT_LATENCY = Histogram(
+    "mia_sentiment_duration_seconds", "Sentiment scoring time",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01)
+)
+MEMORY_RECALL_LATENCY = Histogram(
+    "mia_memory_recall_seconds", "Long-term memory recall time, index catch-up included",
+    buckets=LATENCY_BUCKETS
+)
+
+# Per-request span durations (name -> seconds) for the timing log
+_spans: ContextVar[Optional[Dict[str, float]]] = ContextVar("mia_spans", default=None)
+
+
+def add_span(name: str, seconds: float) -> None:
+    spans = _spans.get()
+    if spans is not None:
+        spans[name] = spans.get(name, 0.0) + seconds
+
+
+@contextmanager
+def timed(histogram: Histogram, span: str, **labels):
+    """Observe the block's duration in `histogram` and the request's spans"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+        add_span(span, elapsed)
+
+
+@contextmanager
+def llm_call(provider: str, mode: str):
+    """Time one LLM provider call, labelled ok or error by how the block exits"""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - started
+        LLM_LATENCY.labels(provider, mode, outcome).observe(elapsed)
+        add_span("llm", elapsed)
+
+
+def record_llm_tokens(provider: str, prompt_tokens: int, completion_tokens: int) -> None:
+    LLM_TOKENS.labels(provider, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(provider, "completion").inc(completion_tokens)
+
+
+def record_error(route: str, exc: BaseException) -> None:
+    REQUEST_ERRORS.labels(route, type(exc).__name__).inc()
+
+
+class _TimedRepository:
+    """Proxy timing every coroutine method of a repository"""
+
+    def __init__(self, repository, name: str):
+        self._repository = repository
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(self._repository, attr)
+        if not inspect.iscoroutinefunction(value):
+            return value
+        histogram = MONGO_LATENCY.labels(operation=f"{self._name}.{attr}")
+
+        @functools.wraps(value)
+        async def call(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await value(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                histogram.observe(elapsed)
+                add_span("mongo", elapsed)
+
+        setattr(self, attr, call)
+        return call
+
+
+def instrument_database(database) -> None:
+    """Time the repositories of a connected Database"""
+    for name in ("users", "pets", "stats", "chats", "segments", "jobs"):
+        repository = getattr(database, name, None)
+        if repository is not None and not isinstance(repository, _TimedRepository):
+            setattr(database, name, _TimedRepository(repository, name))
+
+
+class ComponentStatsCollector:
+    """Exports numeric `stats()` values of caches, admission control and
+    buffers as gauges at scrape time, e.g. mia_component_stat{component=
+    "pet_cache", stat="hit_ratio"}"""
+
+    def __init__(self):
+        self.sources: Dict[str, Callable[[], Optional[dict]]] = {}
+
+    def collect(self):
+        family = GaugeMetricFamily("mia_component_stat", "Internal component counters",
+                                   labels=["component", "stat"])
+        for component, stats in self.sources.items():
+            for stat, value in (stats() or {}).items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                family.add_metric([component, stat], value)
+        yield family
+
+
+component_stats = ComponentStatsCollector()
+REGISTRY.register(component_stats)
+
+
+def render_latest() -> bytes:
+    """Metrics text; with several workers (PROMETHEUS_MULTIPROC_DIR set, see
+    run.py) histograms and counters are summed over all of them, while
+    component gauges come from the worker answering the scrape"""
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(component_stats)
+    return generate_latest(registry)
+
+
+def shutdown_metrics() -> None:
+    """Drop this worker's live gauges from the multiprocess totals"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, in-flight requests and
+    5xx responses, optionally logging one JSON timing line per request
+    with the Mongo, LLM and sentiment spans it spent"""
+
+    def __init__(self, app, timing_logs: bool = False):
+        self.app = app
+        self.timing_logs = timing_logs
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        spans = {}
+        token = _spans.set(spans)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            record_error(getattr(scope.get("route"), "path", "unmatched"), e)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            REQUESTS_IN_FLIGHT.dec()
+            _spans.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(elapsed)
+            if self.timing_logs:
+                logger.info(json.dumps({
+                    "method": scope["method"],
+                    "route": route,
+                    "status": status,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    **{f"{name}_ms": round(seconds * 1000, 2) for name, seconds in spans.items()}
+                }))
+
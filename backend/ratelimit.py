@@ -0,0 +1,163 @@
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+KEY_KINDS = ("user", "pet", "ip")
+
+
+@dataclass(frozen=True)
+class Limit:
+    """`capacity` requests per `period` seconds, refilled continuously"""
+    capacity: int
+    period: float
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+
+def parse_rule(spec: str) -> Dict[str, Limit]:
+    """Parse e.g. "pet=20/60,ip=120/60" into a limit per key kind"""
+    rule = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        kind, _, limit = part.partition("=")
+        kind = kind.strip()
+        if kind not in KEY_KINDS:
+            raise ValueError(f"Unknown rate limit key {kind!r} in {spec!r}")
+        capacity, _, period = limit.partition("/")
+        rule[kind] = Limit(int(capacity), float(period))
+    return rule
+
+
+class RateLimited(Exception):
+    def __init__(self, rule: str, kind: str, limit: Limit, retry_after: float, reset: float):
+        super().__init__(f"Rate limit exceeded for {rule} ({kind}), retry after {math.ceil(retry_after)}s")
+        self.limit = limit
+        self.retry_after = retry_after
+        self.reset = reset
+
+    def headers(self) -> dict:
+        return {
+            "Retry-After": str(math.ceil(self.retry_after)),
+            "X-RateLimit-Limit": str(self.limit.capacity),
+            "X-RateLimit-Remaining": "0",
+            "X-RateLimit-Reset": str(math.ceil(self.reset))
+        }
+
+
+class MemoryBucketStore:
+    """Token buckets in an insertion-ordered dict, O(1) per request.
+
+    Buckets are kept in least-recently-used order; a bucket that has
+    refilled completely is the same as a missing one, so such buckets are
+    dropped lazily from the old end as requests come in. `max_buckets`
+    caps memory under key churn (evicting a bucket only forgives usage).
+    """
+
+    def __init__(self, max_buckets: int = 100000):
+        self.max_buckets = max_buckets
+        # key -> (tokens, updated_at, full_at)
+        self._buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+
+    async def take(self, key: str, limit: Limit) -> Tuple[bool, float]:
+        """Consume a token; returns (allowed, tokens left)"""
+        now = time.monotonic()
+        self._expire(now)
+        bucket = self._buckets.pop(key, None)
+        if bucket is None:
+            tokens = float(limit.capacity)
+        else:
+            tokens = min(limit.capacity, bucket[0] + (now - bucket[1]) * limit.rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now, now + (limit.capacity - tokens) / limit.rate)
+        return allowed, tokens
+
+    def _expire(self, now: float) -> None:
+        while self._buckets:
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now and len(self._buckets) < self.max_buckets:
+                break
+            del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Atomic refill-and-take on a Redis hash, timed by the Redis server clock
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated_at = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared by all workers; idle buckets expire in Redis"""
+
+    def __init__(self, backend, prefix: str = "mia:ratelimit:"):
+        self.backend = backend
+        self.prefix = prefix
+        self._script = None
+
+    async def take(self, key: str, limit: Limit) -> Tuple[bool, float]:
+        if self._script is None:
+            self._script = self.backend.client.register_script(TAKE_SCRIPT)
+        allowed, tokens = await self._script(keys=[self.prefix + key], args=[limit.capacity, limit.rate])
+        return bool(allowed), float(tokens)
+
+    def __len__(self) -> int:
+        return 0
+
+
+def create_bucket_store(backend):
+    """Redis buckets when the state backend is shared, else in-process"""
+    if getattr(backend, "shared", False):
+        return RedisBucketStore(backend, prefix=f"{backend.prefix}ratelimit:")
+    return MemoryBucketStore()
+
+
+class RateLimiter:
+    """Token-bucket limits per route, each keyed by user, pet and/or IP"""
+
+    def __init__(self, rules: Dict[str, Dict[str, Limit]], store):
+        self.rules = rules
+        self.store = store
+        self.rejected = 0
+
+    async def check(self, rule: str, **keys: Optional[str]) -> None:
+        """Take a token from every bucket of `rule` the request falls in;
+        raises RateLimited at the first empty one"""
+        for kind, limit in self.rules.get(rule, {}).items():
+            value = keys.get(kind)
+            if not value:
+                continue
+            allowed, tokens = await self.store.take(f"{rule}:{kind}:{value}", limit)
+            if not allowed:
+                self.rejected += 1
+                raise RateLimited(
+                    rule, kind, limit,
+                    retry_after=(1 - tokens) / limit.rate,
+                    reset=(limit.capacity - tokens) / limit.rate
+                )
+
+    def stats(self) -> dict:
+        return {"buckets": len(self.store), "rejected": self.rejected}
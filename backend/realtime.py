@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict, deque
+from typing import Callable, Optional
+
+from fastapi import WebSocket
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Close code for clients that fall too far behind (RFC 6455 "try again later")
+CLOSE_SLOW_CONSUMER = 1013
+CLOSE_HEARTBEAT_TIMEOUT = 1001
+
+
+class PetHub:
+    """Publish/subscribe of pet events to this worker's open sessions.
+
+    Events travel through the state backend (see shared.py), so with a
+    shared backend a session also receives events published by other
+    workers.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._subscribers = defaultdict(set)
+        backend.add_listener(self._deliver)
+
+    def subscribe(self, pet_id: str, callback: Callable[[dict], None]) -> None:
+        self._subscribers[pet_id].add(callback)
+
+    def unsubscribe(self, pet_id: str, callback: Callable[[dict], None]) -> None:
+        callbacks = self._subscribers.get(pet_id)
+        if callbacks is not None:
+            callbacks.discard(callback)
+            if not callbacks:
+                del self._subscribers[pet_id]
+
+    async def publish(self, pet_id: str, event: dict) -> None:
+        await self.backend.publish(f"pet:{pet_id}", dumps(event))
+
+    def _deliver(self, channel: str, payload: bytes) -> None:
+        if not channel.startswith("pet:"):
+            return
+        callbacks = self._subscribers.get(channel[len("pet:"):])
+        if not callbacks:
+            return
+        event = json.loads(payload)
+        for callback in list(callbacks):
+            callback(event)
+
+    def stats(self) -> dict:
+        return {
+            "pets": len(self._subscribers),
+            "sessions": sum(len(callbacks) for callbacks in self._subscribers.values())
+        }
+
+
+class PetSession:
+    """One client's WebSocket: a bounded send queue drained by a writer task,
+    plus heartbeats.
+
+    `send` never blocks: when more than `max_queue` events are waiting the
+    client is disconnected with 1013 instead of buffering without bound.
+    A `ping` goes out every `heartbeat_interval` seconds and the client is
+    dropped if nothing arrives for two intervals. Stats are sent as deltas
+    against what this client last received.
+    """
+
+    def __init__(self, websocket: WebSocket, max_queue: int, heartbeat_interval: float):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.heartbeat_interval = heartbeat_interval
+        self.closed = False
+        self._close_code = 1000
+        self._queue = deque()
+        self._wakeup = asyncio.Event()
+        self._last_stats = {}
+        self._last_received = time.monotonic()
+        self._tasks = []
+
+    async def __aenter__(self):
+        self._tasks = [asyncio.create_task(self._writer()), asyncio.create_task(self._heartbeat())]
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def send(self, event: dict) -> bool:
+        if self.closed:
+            return False
+        if len(self._queue) >= self.max_queue:
+            logger.warning("Closing WebSocket session: send queue full (%d events)", len(self._queue))
+            self.close(CLOSE_SLOW_CONSUMER)
+            return False
+        self._queue.append(event)
+        self._wakeup.set()
+        return True
+
+    def send_stats(self, stats: Optional[dict]) -> bool:
+        """Send the fields of `stats` that changed since the last stats event"""
+        if not stats:
+            return False
+        # Compared in wire form so database documents and relayed events agree
+        stats = json.loads(dumps(stats))
+        changes = {k: v for k, v in stats.items() if self._last_stats.get(k) != v}
+        if not changes:
+            return False
+        self._last_stats.update(changes)
+        return self.send({"type": "stats", "changes": changes})
+
+    def on_event(self, event: dict) -> None:
+        """PetHub callback"""
+        if event.get("type") == "stats":
+            self.send_stats(event["stats"])
+        else:
+            self.send(event)
+
+    def close(self, code: int = 1000) -> None:
+        if not self.closed:
+            self.closed = True
+            self._close_code = code
+            if code != 1000:
+                self._queue.clear()
+            self._wakeup.set()
+
+    async def receive(self) -> dict:
+        """Next client message; raises asyncio.TimeoutError once the heartbeat lapses"""
+        timeout = 2 * self.heartbeat_interval - (time.monotonic() - self._last_received)
+        text = await asyncio.wait_for(self.websocket.receive_text(), max(0.0, timeout))
+        self._last_received = time.monotonic()
+        return json.loads(text)
+
+    async def _writer(self) -> None:
+        try:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                while self._queue:
+                    event = self._queue.popleft()
+                    await self.websocket.send_text(dumps(event).decode())
+                if self.closed:
+                    await self.websocket.close(code=self._close_code)
+                    return
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The client went away; the receive loop notices the disconnect
+            self.closed = True
+
+    async def _heartbeat(self) -> None:
+        while not self.closed:
+            await asyncio.sleep(self.heartbeat_interval)
+            if time.monotonic() - self._last_received > 2 * self.heartbeat_interval:
+                self.close(CLOSE_HEARTBEAT_TIMEOUT)
+                return
+            self.send({"type": "ping"})
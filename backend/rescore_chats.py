@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Rescore stored chat sentiment and emotion with the current lexicon.
+
+Streams the chats collection in _id order, scores each batch of user
+messages on a process pool and writes back only the documents whose
+user_sentiment/emotion changed, using unordered bulk writes. Progress is
+checkpointed after every batch so an interrupted run can be resumed.
+
+Archived chats are rescored afterwards, pet by pet: a segment with changed
+scores gets its data and stats rewritten, then the pet's archive totals
+and conversation summary are rebuilt from its segments. This phase is not
+checkpointed; rerunning it only rewrites segments that still differ.
+Servers pick up rewritten segments once their segment cache entries expire.
+
+Usage:
+    python rescore_chats.py [--batch-size 5000] [--workers 4] [--dry-run]
+                            [--checkpoint rescore.checkpoint] [--restart]
+                            [--skip-segments]
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+from archive import aggregate, merge_aggregates, pack_chats, summarize, unpack_chats
+from database import Database
+from sentiment import default_engine, get_emotion_from_sentiment
+
+PROJECTION = {"user_message": 1, "user_sentiment": 1, "emotion": 1}
+
+
+def score_messages(messages: List[str]) -> List[Tuple[float, str]]:
+    """Worker-side scoring of one chunk of user messages"""
+    scores = default_engine.score_many(messages)
+    return [(score, get_emotion_from_sentiment(score)) for score in scores]
+
+
+def read_checkpoint(path: str) -> Optional[ObjectId]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        value = f.read().strip()
+    return ObjectId(value) if value else None
+
+
+def write_checkpoint(path: str, last_id: ObjectId) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(last_id))
+    os.replace(tmp_path, path)
+
+
+async def score_batch(pool: ProcessPoolExecutor, workers: int, batch: List[dict]) -> List[Tuple[float, str]]:
+    loop = asyncio.get_running_loop()
+    messages = [chat.get("user_message") or "" for chat in batch]
+    chunk_size = max(1, -(-len(messages) // workers))
+    chunks = [messages[i:i + chunk_size] for i in range(0, len(messages), chunk_size)]
+    results = await asyncio.gather(*(loop.run_in_executor(pool, score_messages, c) for c in chunks))
+    return [item for chunk in results for item in chunk]
+
+
+async def rescore_segments(database, pool: ProcessPoolExecutor, workers: int,
+                           dry_run: bool) -> Tuple[int, int, int]:
+    """Rescore archived chats; returns (scanned, changed, written) chat counts"""
+    scanned = changed = written = 0
+    for pet_id in await database.segments.pet_ids():
+        totals = None
+        rewritten = False
+        for segment in await database.segments.for_pet(pet_id, {"data": 1}):
+            chats = unpack_chats(segment["data"])
+            results = await score_batch(pool, workers, chats)
+            updates = 0
+            for chat, (score, emotion) in zip(chats, results):
+                if chat.get("user_sentiment") != score or chat.get("emotion") != emotion:
+                    chat["user_sentiment"], chat["emotion"] = score, emotion
+                    updates += 1
+            stats = aggregate(chats)
+            totals = merge_aggregates(totals, stats)
+            scanned += len(chats)
+            changed += updates
+            if updates and not dry_run:
+                await database.segments.update(segment["_id"], {"data": pack_chats(chats), "stats": stats})
+                written += updates
+                rewritten = True
+        if rewritten:
+            await database.pets.update(pet_id, {"chat_archive": totals, "conversation_summary": summarize(totals)})
+        print(f"archived pet={pet_id} scanned={scanned} changed={changed} written={written}")
+    return scanned, changed, written
+
+
+async def rescore(args) -> None:
+    database = Database.from_env()
+    database.connect()
+    chats = database.chats
+
+    after_id = None if args.restart else read_checkpoint(args.checkpoint)
+    if after_id is not None:
+        print(f"Resuming after _id {after_id}")
+
+    scanned = changed = written = 0
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            batch = await chats.scan(after_id, args.batch_size, PROJECTION)
+            while batch:
+                # Fetch the next batch while this one is scored and written
+                last_id = batch[-1]["_id"]
+                next_batch = asyncio.create_task(chats.scan(last_id, args.batch_size, PROJECTION))
+
+                results = await score_batch(pool, args.workers, batch)
+                updates = [
+                    (chat["_id"], {"user_sentiment": score, "emotion": emotion})
+                    for chat, (score, emotion) in zip(batch, results)
+                    if chat.get("user_sentiment") != score or chat.get("emotion") != emotion
+                ]
+                scanned += len(batch)
+                changed += len(updates)
+                if not args.dry_run:
+                    written += await chats.bulk_set(updates)
+                    write_checkpoint(args.checkpoint, last_id)
+
+                elapsed = time.perf_counter() - started
+                print(f"scanned={scanned} changed={changed} written={written} "
+                      f"last_id={last_id} rate={scanned / elapsed:.0f} docs/s")
+
+                if args.limit and scanned >= args.limit:
+                    next_batch.cancel()
+                    break
+                batch = await next_batch
+
+            if not args.skip_segments and not (args.limit and scanned >= args.limit):
+                archived_scanned, archived_changed, archived_written = await rescore_segments(
+                    database, pool, args.workers, args.dry_run
+                )
+                scanned += archived_scanned
+                changed += archived_changed
+                written += archived_written
+    finally:
+        database.close()
+
+    elapsed = time.perf_counter() - started
+    mode = " (dry run, nothing written)" if args.dry_run else ""
+    print(f"Done{mode}: {scanned} chats scanned, {changed} changed, {written} written "
+          f"in {elapsed:.1f}s ({scanned / elapsed if elapsed else 0:.0f} docs/s)")
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Rescore stored chat sentiment and emotion")
+    parser.add_argument("--batch-size", type=int, default=5000, help="chats read per batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="scoring processes")
+    parser.add_argument("--checkpoint", default="rescore.checkpoint", help="file holding the last processed _id")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the beginning")
+    parser.add_argument("--limit", type=int, default=0, help="stop after roughly this many chats (0 = all)")
+    parser.add_argument("--dry-run", action="store_true", help="score and report without writing")
+    parser.add_argument("--skip-segments", action="store_true", help="leave archived chats as they are")
+    asyncio.run(rescore(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
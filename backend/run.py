@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Production launcher: runs server:app in several uvicorn worker processes.
+
+Each worker imports server.py and opens its own Mongo, LLM and state
+backend clients in the lifespan hook. On SIGTERM/SIGINT workers stop
+accepting connections, let in-flight requests finish for up to
+--graceful-timeout seconds, then run lifespan shutdown (flushing the
+write-behind buffer and closing clients). Several workers need
+STATE_BACKEND=redis for rate limits, or RATE_LIMITS=false.
+
+    python run.py --workers 4 --port 8001
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+
+import uvicorn
+from dotenv import load_dotenv
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger("mia.run")
+
+
+def prepare_metrics_dir() -> None:
+    """Workers share Prometheus samples through files in an empty directory"""
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+    else:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="mia-metrics-")
+
+
+def enabled(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def check_process_local_state(parser: argparse.ArgumentParser) -> None:
+    """Refuse or warn about state that each worker would keep to itself"""
+    # Buffered writes live in the worker that took them, so reads served
+    # by any other worker would miss them
+    if enabled("WRITE_BEHIND", "false"):
+        parser.error("WRITE_BEHIND buffers chats in each worker's memory; "
+                     "run with --workers 1 or unset WRITE_BEHIND")
+    if os.getenv("STATE_BACKEND", "memory").lower() != "memory":
+        return
+    # Every worker would keep its own token buckets, multiplying each limit
+    if enabled("RATE_LIMITS", "true"):
+        parser.error("STATE_BACKEND=memory keeps rate-limit buckets per worker, so every limit "
+                     "would be multiplied by --workers; set STATE_BACKEND=redis, run with "
+                     "--workers 1 or set RATE_LIMITS=false")
+    logger.warning("STATE_BACKEND=memory: pet-cache invalidations and WebSocket stats changes "
+                   "stay on the worker that made them; set STATE_BACKEND=redis")
+
+
+def main():
+    load_dotenv(os.path.join(BACKEND_DIR, ".env"))
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run the MIA backend with multiple workers")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+                        help="worker processes (default: WEB_CONCURRENCY or the number of cores)")
+    parser.add_argument("--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "30")),
+                        help="seconds in-flight requests get to finish on shutdown")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        check_process_local_state(parser)
+        prepare_metrics_dir()
+
+    uvicorn.run(
+        "server:app",
+        app_dir=BACKEND_DIR,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        log_level=args.log_level
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import re
+import string
+from itertools import compress, count
+from typing import Dict, Iterable, List, Optional
+
+
+# Default lexicons (word -> weight). Positive weights raise the score,
+# negative weights lower it.
+POSITIVE_WORDS = {
+    'love': 1.0, 'happy': 1.0, 'joy': 1.0, 'great': 1.0, 'awesome': 1.0,
+    'wonderful': 1.0, 'good': 1.0, 'nice': 1.0, 'beautiful': 1.0, 'amazing': 1.0,
+    'excited': 1.0, 'yes': 1.0, 'perfect': 1.0, 'best': 1.0
+}
+NEGATIVE_WORDS = {
+    'hate': -1.0, 'sad': -1.0, 'bad': -1.0, 'terrible': -1.0, 'awful': -1.0,
+    'horrible': -1.0, 'no': -1.0, 'never': -1.0, 'angry': -1.0, 'upset': -1.0,
+    'disappointed': -1.0, 'lonely': -1.0, 'miss': -1.0
+}
+# Words that flip the polarity of a lexicon word shortly after them
+NEGATORS = {
+    'not', 'no', 'never', "don't", 'dont', "doesn't", "didn't", "isn't", "wasn't",
+    "aren't", "can't", 'cannot', "won't", 'nothing', 'hardly'
+}
+NEGATION_WINDOW = 3
+
+# Clause punctuation ends a negation scope and becomes a "." token; other
+# punctuation separates words. Apostrophes inside a word stay so "don't" is
+# one token; leading and trailing ones are quotes and separate words too.
+CLAUSE_BREAK = "."
+_CLAUSE_PUNCTUATION = ".!?;,…"
+_SEPARATORS = "".join(ch for ch in string.punctuation + "“”‘«»()[]{}"
+                      if ch != "'" and ch not in _CLAUSE_PUNCTUATION)
+_SPACED_BREAK = f" {CLAUSE_BREAK} "
+# ASCII text: every character maps to a single ASCII one, which keeps
+# str.translate on its fast path, then clause breaks are spaced out with
+# one str.replace. translate is slow once it meets a non-ASCII character,
+# so other text goes through two character-class substitutions instead.
+_ASCII_TRANSLATION = {ord(ch): " " for ch in _SEPARATORS if ch.isascii()}
+_ASCII_TRANSLATION.update({ord(ch): CLAUSE_BREAK for ch in _CLAUSE_PUNCTUATION if ch.isascii()})
+_SEPARATOR_PATTERN = re.compile("[%s]" % re.escape(_SEPARATORS))
+_CLAUSE_PATTERN = re.compile("[%s]" % re.escape(_CLAUSE_PUNCTUATION))
+_QUOTE_PATTERN = re.compile(r"\B'|'\B")
+
+
+class SentimentEngine:
+    """Word-boundary lexicon scorer built once and reused for every message.
+
+    Text is tokenized with C-level translate/split and tokens are looked up
+    in a frozen term set, so only whole words match ("know" is not "no").
+    Lookups run at C level (set intersection, map, compress): a message
+    without negators is scored without a per-word Python loop, otherwise
+    only its lexicon words and negators are visited.
+    Scores are in -1..1: the weighted balance of positive and negative
+    matches. A lexicon word within `negation_window` words after a negator
+    in the same clause ("not happy") counts with flipped polarity; the
+    negator is then not scored on its own.
+    """
+
+    def __init__(self, lexicon: Optional[Dict[str, float]] = None,
+                 negators: Iterable[str] = NEGATORS, negation_window: int = NEGATION_WINDOW):
+        if lexicon is None:
+            lexicon = {**POSITIVE_WORDS, **NEGATIVE_WORDS}
+        self.lexicon = {word.lower(): weight for word, weight in lexicon.items()}
+        self.negators = frozenset(word.lower() for word in negators)
+        self.negation_window = negation_window
+        self._compile()
+
+    def _compile(self):
+        self._terms = frozenset(self.lexicon) | self.negators
+
+    def extend(self, lexicon: Dict[str, float]) -> None:
+        """Add or reweight lexicon words"""
+        self.lexicon.update({word.lower(): weight for word, weight in lexicon.items()})
+        self._compile()
+
+    def tokenize(self, text: str) -> List[str]:
+        text = text.lower()
+        if text.isascii():
+            text = text.translate(_ASCII_TRANSLATION)
+            if "'" in text:
+                text = _QUOTE_PATTERN.sub(" ", text)
+            return text.replace(CLAUSE_BREAK, _SPACED_BREAK).split()
+        text = _SEPARATOR_PATTERN.sub(" ", text.replace("’", "'"))
+        if "'" in text:
+            text = _QUOTE_PATTERN.sub(" ", text)
+        return _CLAUSE_PATTERN.sub(_SPACED_BREAK, text).split()
+
+    def score(self, text: str) -> float:
+        return self._score(self.tokenize(text))
+
+    def score_many(self, texts: Iterable[str]) -> List[float]:
+        """Score a batch of texts, e.g. for rescoring stored chats"""
+        return list(map(self._score, map(self.tokenize, texts)))
+
+    def _score(self, words: List[str]) -> float:
+        present = self._terms.intersection(words)
+        if not present:
+            return 0.0
+        lexicon = self.lexicon
+        if self.negators.isdisjoint(present):
+            # Nothing to negate: every lexicon word counts as it is
+            weights = [lexicon[word] * words.count(word) for word in present]
+        else:
+            weights = self._negated_weights(words)
+
+        positive = sum(filter((0.0).__lt__, weights))
+        negative = -sum(filter((0.0).__gt__, weights))
+        total = positive + negative
+        if total == 0:
+            return 0.0
+        return max(-1.0, min(1.0, (positive - negative) / total))
+
+    def _negated_weights(self, words: List[str]) -> List[float]:
+        lexicon = self.lexicon
+        negators = self.negators
+        window = self.negation_window
+        weights = []
+        pending = None  # index of a negator waiting for a word to negate
+
+        # Only lexicon words and negators are visited
+        for i in compress(count(), map(self._terms.__contains__, words)):
+            word = words[i]
+            weight = lexicon.get(word)
+            if pending is not None:
+                negator = words[pending]
+                in_scope = i - pending <= window and CLAUSE_BREAK not in words[pending + 1:i]
+                pending = None
+                if weight is not None and in_scope:
+                    weights.append(-weight)
+                    continue
+                # Nothing to negate: the negator counts on its own, if at all
+                if negator in lexicon:
+                    weights.append(lexicon[negator])
+            if word in negators:
+                pending = i
+            elif weight is not None:
+                weights.append(weight)
+        if pending is not None and words[pending] in lexicon:
+            weights.append(lexicon[words[pending]])
+        return weights
+
+
+default_engine = SentimentEngine()
+
+
+def analyze_sentiment(text: str) -> float:
+    """Sentiment score (-1 to 1) of a message using the default lexicon"""
+    return default_engine.score(text)
+
+
+def get_emotion_from_sentiment(sentiment_score: float) -> str:
+    """Convert sentiment score (-1 to 1) to emotion state"""
+    if sentiment_score > 0.5:
+        return "happy"
+    elif sentiment_score > 0.2:
+        return "content"
+    elif sentiment_score > -0.2:
+        return "neutral"
+    elif sentiment_score > -0.5:
+        return "sad"
+    else:
+        return "very_sad"
@@ -0,0 +1,29 @@
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+
+def default(obj: Any):
+    """orjson fallback for the BSON types found in Mongo documents"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> bytes:
+    """Encode Mongo documents as-is: ObjectIds become strings and naive
+    datetimes keep the isoformat() text jsonable_encoder produced"""
+    return orjson.dumps(data, default=default)
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response encoded by orjson with ObjectId support.
+
+    Returning an instance from an endpoint skips FastAPI's jsonable_encoder
+    pass, so documents are encoded straight from the driver's dicts.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,20 +1,198 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from pymongo import MongoClient
-from bson import ObjectId
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
+from bson import ObjectId
 from typing import Optional, List
 import os
 from dotenv import load_dotenv
-# from emergentintegrations.llm.chat import LlmChat, UserMessage
-import openai
+from database import Database, EPOCH, HISTORY_PAGE_SIZE, HISTORY_PROJECTION, decay_stage
+from cache import LRUTTLCache, ResponseCache
+from sentiment import analyze_sentiment, get_emotion_from_sentiment
+from context import CONTEXT_PROJECTION, build_context, context_history_limit, estimate_tokens
+from llm import create_provider, is_transient_error, LLMResult
+from decay import DecayScheduler, HOURLY_DECAY, current_stats
+from admission import AdmissionController, CircuitBreaker, CircuitOpen, Overloaded
+from realtime import PetHub, PetSession
+from shared import create_state_backend
+from ratelimit import RateLimited, RateLimiter, create_bucket_store, parse_rule
+from serialization import ORJSONResponse, dumps
+from httpcache import conditional_response, etag_matches, make_etag
+from writebehind import WriteBehindBuffer
+from memory import HashingEmbedder, MemoryStore
+from archive import ChatArchive, ChatArchiver
+from metrics import (
+    CONTENT_TYPE_LATEST, LLM_FIRST_TOKEN, MEMORY_RECALL_LATENCY, SENTIMENT_LATENCY, MetricsMiddleware,
+    component_stats, instrument_database, llm_call, record_error, record_llm_tokens, render_latest,
+    shutdown_metrics, timed
+)
+from fastapi.exception_handlers import http_exception_handler
 import asyncio
+import logging
+import time
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # optional; gzip only without it
+    BrotliMiddleware = None
 
 
 load_dotenv()
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# MongoDB (pooled async client, created per process on startup)
+database = Database.from_env()
+
+# LLM provider (openai, emergent or fake), selected by LLM_PROVIDER on startup
+llm = None
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "150"))
+
+# Admission control for the LLM upstream: concurrency cap, bounded queue,
+# per-request deadline, jittered retries and a circuit breaker
+admission = AdmissionController(
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "64")),
+    deadline=float(os.getenv("LLM_DEADLINE_SECONDS", "20")),
+    retries=int(os.getenv("LLM_RETRIES", "2")),
+    backoff=float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.25")),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+    ),
+    is_transient=is_transient_error,
+    min_call_budget=float(os.getenv("LLM_MIN_CALL_SECONDS", "2"))
+)
+
+# Optional exact-match cache of LLM replies (e.g. repeated greetings)
+response_cache = None
+if os.getenv("LLM_RESPONSE_CACHE", "false").lower() in ("1", "true", "yes"):
+    response_cache = ResponseCache(
+        maxsize=int(os.getenv("LLM_RESPONSE_CACHE_SIZE", "5000")),
+        ttl=float(os.getenv("LLM_RESPONSE_CACHE_TTL_SECONDS", "3600")),
+        context_turns=int(os.getenv("LLM_RESPONSE_CACHE_CONTEXT_TURNS", "1"))
+    )
+
+# Pets left alone this long are reported as missing their owner
+INACTIVE_AFTER = timedelta(hours=float(os.getenv("INACTIVE_AFTER_HOURS", "24")))
+
+# Stat decay: "scheduled" writes decay to all stats periodically, "lazy"
+# computes it on read and persists it with the pet's next write, "off"
+# disables it. Inactivity flags are maintained in the background either way.
+STAT_DECAY_MODE = os.getenv("STAT_DECAY_MODE", "scheduled").lower()
+LAZY_DECAY = STAT_DECAY_MODE == "lazy"
+
+decay_scheduler = None
+if os.getenv("PET_DECAY_SCHEDULER", "true").lower() in ("1", "true", "yes"):
+    decay_scheduler = DecayScheduler(
+        database,
+        decay_interval=float(os.getenv("STAT_DECAY_INTERVAL_SECONDS", "3600")),
+        inactive_check_interval=float(os.getenv("INACTIVE_CHECK_INTERVAL_SECONDS", "300")),
+        inactive_after=INACTIVE_AFTER,
+        apply_decay=STAT_DECAY_MODE == "scheduled"
+    )
+
+# Old chats are compacted into per-pet compressed segments; history reads
+# fall back to them, the optional job (CHAT_ARCHIVE) does the compacting
+chat_archive = ChatArchive(
+    database,
+    cache_size=int(os.getenv("CHAT_ARCHIVE_CACHE_SIZE", "256")),
+    cache_ttl=float(os.getenv("CHAT_ARCHIVE_CACHE_TTL_SECONDS", "600"))
+)
+archiver = None
+if os.getenv("CHAT_ARCHIVE", "false").lower() in ("1", "true", "yes"):
+    archiver = ChatArchiver(
+        database,
+        archive_after=timedelta(days=float(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "90"))),
+        interval=float(os.getenv("CHAT_ARCHIVE_INTERVAL_SECONDS", "3600")),
+        segment_size=int(os.getenv("CHAT_ARCHIVE_SEGMENT_SIZE", "500")),
+        min_segment_size=int(os.getenv("CHAT_ARCHIVE_MIN_SEGMENT_SIZE", "50")),
+        on_pet_update=lambda pet_id: invalidate_pet(pet_id)
+    )
+
+# Long-term memory: old chats similar to the message are recalled into the
+# prompt from a per-pet vector index of locally embedded exchanges. Off by
+# default; when on, new chats carry an embedding, each worker builds a pet's
+# index on its first chat and older chats are backfilled with one
+memory = None
+if os.getenv("PET_MEMORY", "false").lower() in ("1", "true", "yes"):
+    memory = MemoryStore(
+        database,
+        HashingEmbedder(dim=int(os.getenv("PET_MEMORY_DIM", "256"))),
+        top_k=int(os.getenv("PET_MEMORY_TOP_K", "3")),
+        min_score=float(os.getenv("PET_MEMORY_MIN_SCORE", "0.3")),
+        # Allocated rows across all pets; 200k rows of 256 float16 dims is ~100 MB per worker
+        max_vectors=int(os.getenv("PET_MEMORY_MAX_VECTORS", "200000")),
+        archive=chat_archive
+    )
+MEMORY_RECALL_TIMEOUT = float(os.getenv("PET_MEMORY_RECALL_TIMEOUT_MS", "100")) / 1000
+
+# State shared across worker processes (STATE_BACKEND=memory|redis)
+state_backend = create_state_backend()
+
+# Token-bucket limits per route as "kind=requests/seconds" for kinds user,
+# pet and ip; buckets live in the state backend's store
+rate_limiter = None
+if os.getenv("RATE_LIMITS", "true").lower() in ("1", "true", "yes"):
+    rate_limiter = RateLimiter(
+        {
+            "chat": parse_rule(os.getenv("RATE_LIMIT_CHAT", "pet=20/60,ip=120/60")),
+            "stats_update": parse_rule(os.getenv("RATE_LIMIT_STATS_UPDATE", "pet=60/60,ip=300/60")),
+            "pet_create": parse_rule(os.getenv("RATE_LIMIT_PET_CREATE", "user=5/3600,ip=20/3600")),
+        },
+        create_bucket_store(state_backend)
+    )
+
+# Live pet events (stats changes) pushed to open WebSocket sessions
+hub = PetHub(state_backend)
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", "20"))
+
+# Optional write-behind of chat logs and pet touches: the reply does not
+# wait for those writes; reads of a pet's history flush its writes first.
+# Buffers are per process, so run.py refuses it with several workers
+write_buffer = None
+if os.getenv("WRITE_BEHIND", "false").lower() in ("1", "true", "yes"):
+    write_buffer = WriteBehindBuffer(
+        database,
+        flush_interval=float(os.getenv("WRITE_BEHIND_FLUSH_MS", "200")) / 1000,
+        batch_size=int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500")),
+        max_pending=int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global llm
+    # Clients are created here, per worker process, never at import time
+    await state_backend.start()
+    database.connect()
+    instrument_database(database)
+    llm = create_provider()
+    await database.ensure_indexes()
+    if decay_scheduler is not None:
+        decay_scheduler.start()
+    if write_buffer is not None:
+        write_buffer.start()
+    if archiver is not None:
+        archiver.start()
+    yield
+    if archiver is not None:
+        await archiver.stop()
+    if memory is not None:
+        await memory.close()
+    if decay_scheduler is not None:
+        await decay_scheduler.stop()
+    if write_buffer is not None:
+        await write_buffer.close()
+    await llm.close()
+    database.close()
+    await state_backend.close()
+    shutdown_metrics()
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # CORS
 app.add_middleware(
@@ -23,19 +201,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-# MongoDB
-MONGO_URL = os.getenv("MONGO_URL")
-client = MongoClient(MONGO_URL)
-db = client["mia_db"]
-users_collection = db["users"]
-pets_collection = db["pets"]
-chats_collection = db["chats"]
-stats_collection = db["stats"]
+# Compress larger responses (history pages); streams are left alone so
+# tokens are not held back in the compressor
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1000"))
+if BrotliMiddleware is not None:
+    app.add_middleware(
+        BrotliMiddleware,
+        minimum_size=COMPRESSION_MIN_BYTES,
+        gzip_fallback=True,
+        excluded_handlers=[r"^/api/chat/stream"]
+    )
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
+# Outermost, so route latency includes compression. REQUEST_TIMING_LOGS
+# adds one JSON line per request with its Mongo/LLM/sentiment time.
+app.add_middleware(
+    MetricsMiddleware,
+    timing_logs=os.getenv("REQUEST_TIMING_LOGS", "false").lower() in ("1", "true", "yes")
+)
 
-# Emergent LLM Key
-EMERGENT_LLM_KEY = os.getenv("EMERGENT_LLM_KEY")
+@app.exception_handler(HTTPException)
+async def log_server_errors(request: Request, exc: HTTPException):
+    """Endpoints wrap failures in HTTPException(500); log and count the cause"""
+    if exc.status_code >= 500:
+        cause = exc.__context__ or exc
+        route = getattr(request.scope.get("route"), "path", request.url.path)
+        logger.error("%s %s failed: %r", request.method, route, cause,
+                     exc_info=(type(cause), cause, cause.__traceback__))
+        record_error(route, cause)
+    return await http_exception_handler(request, exc)
 
 # Predefined personalities
 PREDEFINED_PERSONALITIES = [
@@ -44,6 +242,44 @@ PREDEFINED_PERSONALITIES = [
     {"id": "adventurous", "name": "Adventurous", "description": "Bold and curious, always ready for new experiences!", "emoji": "🌟"},
     {"id": "calm", "name": "Calm", "description": "Peaceful and wise, brings tranquility to your day.", "emoji": "🧘"}
 ]
+PERSONALITIES_BY_ID = {p["id"]: p for p in PREDEFINED_PERSONALITIES}
+
+# Static, so encoded once and cacheable by clients and proxies
+PERSONALITIES_BODY = dumps({"personalities": PREDEFINED_PERSONALITIES})
+PERSONALITIES_ETAG = make_etag(PERSONALITIES_BODY)
+PERSONALITIES_CACHE_CONTROL = f"public, max-age={int(os.getenv('PERSONALITIES_MAX_AGE_SECONDS', '86400'))}"
+
+# Pet documents and rendered personality prompts for the chat hot path
+pet_cache = LRUTTLCache(
+    maxsize=int(os.getenv("PET_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PET_CACHE_TTL_SECONDS", "300"))
+)
+# Pet writes drop the cached entry in every worker through the state backend
+PET_CACHE_CHANNEL = "pet-cache"
+
+def drop_cached_pet(channel: str, payload: bytes) -> None:
+    if channel == PET_CACHE_CHANNEL:
+        pet_cache.invalidate(payload.decode())
+
+state_backend.add_listener(drop_cached_pet)
+
+async def invalidate_pet(pet_id: str) -> None:
+    """Call after writing a pet document (chat touches update the entry in place)"""
+    await state_backend.publish(PET_CACHE_CHANNEL, pet_id.encode())
+
+# Chat history paging
+MAX_HISTORY_PAGE_SIZE = int(os.getenv("MAX_HISTORY_PAGE_SIZE", "100"))
+HISTORY_FIELDS = {"user_message", "ai_response", "user_sentiment", "emotion", "timestamp", "pet_id"}
+
+# LLM conversation context
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+CONTEXT_HISTORY_LIMIT = context_history_limit()
+
+# Fields check-inactive needs from a pet
+INACTIVE_PROJECTION = {"name": 1, "last_interaction": 1, "inactive": 1}
+
+# Stat changes applied on every chat message
+INTERACTION_STAT_DELTAS = {"affection": 5, "energy": -2}
 
 # Pydantic Models
 class CreatePetRequest(BaseModel):
@@ -64,40 +300,130 @@ class UpdateStatsRequest(BaseModel):
     hunger: Optional[int] = None
     energy: Optional[int] = None
 
+# Response models: these document the payloads in OpenAPI. Endpoints return
+# ORJSONResponse directly, so documents are neither validated against them
+# nor copied through jsonable_encoder.
+class PetModel(BaseModel):
+    id: str = Field(alias="_id")
+    user_id: str
+    name: str
+    personality_type: str
+    personality_id: Optional[str] = None
+    custom_personality: Optional[str] = None
+    color: str
+    level: int = 1
+    created_at: datetime
+    last_interaction: datetime
+    inactive: Optional[bool] = None
+    conversation_summary: Optional[str] = None
+    # Aggregates of archived chats (count, sentiment, emotions, topics)
+    chat_archive: Optional[dict] = None
+
+class StatsModel(BaseModel):
+    id: str = Field(alias="_id")
+    pet_id: str
+    affection: int
+    hunger: int
+    energy: int
+    mood: str
+    updated_at: datetime
+
+class ChatModel(BaseModel):
+    # Fields other than _id and timestamp may be left out via `fields`
+    id: str = Field(alias="_id")
+    timestamp: datetime
+    pet_id: Optional[str] = None
+    user_message: Optional[str] = None
+    ai_response: Optional[str] = None
+    user_sentiment: Optional[float] = None
+    emotion: Optional[str] = None
+
+class HistoryPage(BaseModel):
+    chats: List[ChatModel]
+    has_more: bool
+    before_cursor: Optional[str] = None
+    after_cursor: Optional[str] = None
+
+class InactivityStatus(BaseModel):
+    inactive: bool
+    hours: Optional[int] = None
+    message: Optional[str] = None
+
+class PetResponse(BaseModel):
+    pet: PetModel
+    stats: Optional[StatsModel] = None
+
+class CreatePetResponse(PetResponse):
+    success: bool
+
+class BootstrapResponse(PetResponse):
+    history: HistoryPage
+    inactivity: InactivityStatus
+
+class ChatResponse(BaseModel):
+    success: bool
+    response: str
+    emotion: str
+    sentiment_score: float
+    stats: Optional[StatsModel] = None
+
+class StatsResponse(BaseModel):
+    stats: StatsModel
+
+class UpdateStatsResponse(BaseModel):
+    success: bool
+    stats: Optional[StatsModel] = None
+
 # Helper Functions
-def serialize_doc(doc):
-    if doc and "_id" in doc:
-        doc["_id"] = str(doc["_id"])
-    return doc
-
-def get_emotion_from_sentiment(sentiment_score: float) -> str:
-    """Convert sentiment score (-1 to 1) to emotion state"""
-    if sentiment_score > 0.5:
-        return "happy"
-    elif sentiment_score > 0.2:
-        return "content"
-    elif sentiment_score > -0.2:
-        return "neutral"
-    elif sentiment_score > -0.5:
-        return "sad"
-    else:
-        return "very_sad"
 
-def analyze_sentiment(text: str) -> float:
-    """Simple sentiment analysis based on keywords"""
-    positive_words = ['love', 'happy', 'joy', 'great', 'awesome', 'wonderful', 'good', 'nice', 'beautiful', 'amazing', 'excited', 'yes', 'perfect', 'best']
-    negative_words = ['hate', 'sad', 'bad', 'terrible', 'awful', 'horrible', 'no', 'never', 'angry', 'upset', 'disappointed', 'lonely', 'miss']
-    
-    text_lower = text.lower()
-    positive_count = sum(1 for word in positive_words if word in text_lower)
-    negative_count = sum(1 for word in negative_words if word in text_lower)
-    
-    total = positive_count + negative_count
-    if total == 0:
-        return 0.0
-    
-    score = (positive_count - negative_count) / max(total, 1)
-    return max(-1.0, min(1.0, score))
+def encode_cursor(chat: dict) -> str:
+    """Opaque history cursor for a chat's (timestamp, _id) position"""
+    millis = (chat["timestamp"] - EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}_{chat['_id']}"
+
+def decode_cursor(cursor: str):
+    try:
+        millis, chat_id = cursor.split("_", 1)
+        timestamp = EPOCH + timedelta(milliseconds=int(millis))
+        return timestamp, ObjectId(chat_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def parse_projection(fields: Optional[str]) -> dict:
+    """Mongo projection for a comma-separated `fields` parameter"""
+    if not fields:
+        return HISTORY_PROJECTION
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - HISTORY_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # Cursors are built from timestamp and _id, so they are always returned
+    return {field: 1 for field in requested | {"timestamp"}}
+
+def history_page(chats: List[dict], has_more: bool) -> dict:
+    return {
+        "chats": chats,
+        "has_more": has_more,
+        "before_cursor": encode_cursor(chats[0]) if chats else None,
+        "after_cursor": encode_cursor(chats[-1]) if chats else None
+    }
+
+def inactivity_status(pet: dict) -> dict:
+    """Whether the pet misses its owner, from the scheduler-maintained flag"""
+    # Touches clear the flag but only the scheduler sets it, so a cleared
+    # or missing flag is checked against the time since the last interaction
+    last_interaction = pet.get("last_interaction")
+    inactive = pet.get("inactive")
+    if not inactive and last_interaction:
+        inactive = datetime.utcnow() - last_interaction >= INACTIVE_AFTER
+    if inactive and last_interaction:
+        hours_inactive = (datetime.utcnow() - last_interaction).total_seconds() / 3600
+        return {
+            "inactive": True,
+            "hours": int(hours_inactive),
+            "message": f"{pet.get('name', 'MIA')} misses you! 🥺"
+        }
+    return {"inactive": False}
 
 def get_personality_prompt(pet_data: dict) -> str:
     """Generate personality prompt for AI"""
@@ -108,7 +434,7 @@ def get_personality_prompt(pet_data: dict) -> str:
     
     if personality_type == "predefined":
         personality_id = pet_data.get("personality_id")
-        personality = next((p for p in PREDEFINED_PERSONALITIES if p["id"] == personality_id), None)
+        personality = PERSONALITIES_BY_ID.get(personality_id)
         if personality:
             base_prompt += f"Your personality is {personality['name']}: {personality['description']} "
     elif personality_type == "custom":
@@ -118,6 +444,56 @@ def get_personality_prompt(pet_data: dict) -> str:
     base_prompt += "Keep responses short, warm, and emotionally expressive (2-3 sentences max). Show emotions through your words."
     return base_prompt
 
+def pet_version(pet: dict) -> tuple:
+    """Fields whose change alters a pet payload, for ETags"""
+    return (pet["_id"], pet.get("last_interaction"), pet.get("inactive"), pet.get("conversation_summary"))
+
+def stats_version(stats: Optional[dict]) -> Optional[tuple]:
+    """Stats payload version; the values are included because scheduled and
+    lazy decay change them without touching updated_at"""
+    if not stats:
+        return None
+    return (stats.get("updated_at"), stats.get("affection"), stats.get("hunger"),
+            stats.get("energy"), stats.get("mood"))
+
+def read_stats(stats: Optional[dict]) -> Optional[dict]:
+    """Stats as they are now, applying lazy decay since the last write"""
+    if stats and LAZY_DECAY:
+        return current_stats(stats, datetime.utcnow())
+    return stats
+
+def pending_decay(now: datetime) -> Optional[dict]:
+    """Decay stage to persist along with a stats write in lazy mode"""
+    return decay_stage(now, HOURLY_DECAY) if LAZY_DECAY else None
+
+def client_ip(connection) -> Optional[str]:
+    return connection.client.host if connection.client else None
+
+async def check_rate_limit(rule: str, **keys: Optional[str]) -> None:
+    """Answer 429 with quota headers once one of the route's buckets is empty"""
+    if rate_limiter is None:
+        return
+    try:
+        await rate_limiter.check(rule, **keys)
+    except RateLimited as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=e.headers())
+
+async def flush_pending(pet_id: str) -> None:
+    """Read-your-writes: store the pet's buffered chats and touch before reading them"""
+    if write_buffer is not None:
+        await write_buffer.flush_pet(pet_id)
+
+async def load_pet(pet_id: str):
+    """Return (pet, personality_prompt) from the pet cache, loading on a miss"""
+    entry = pet_cache.get(pet_id)
+    if entry is None:
+        pet = await database.pets.get(pet_id)
+        if not pet:
+            return None, None
+        entry = (pet, get_personality_prompt(pet))
+        pet_cache.set(pet_id, entry)
+    return entry
+
 # API Endpoints
 @app.get("/")
 async def root():
@@ -127,11 +503,49 @@ async def health_check():
     return {"status": "healthy", "service": "MIA Backend"}
 
 @app.get("/api/personalities")
-async def get_personalities():
-    return {"personalities": PREDEFINED_PERSONALITIES}
+async def get_personalities(request: Request):
+    headers = {"ETag": PERSONALITIES_ETAG, "Cache-Control": PERSONALITIES_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), PERSONALITIES_ETAG):
+        return Response(status_code=304, headers=headers)
+    return Response(PERSONALITIES_BODY, media_type="application/json", headers=headers)
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return {
+        "pet_cache": pet_cache.stats(),
+        "llm_response_cache": response_cache.stats() if response_cache is not None else None,
+        "ws_sessions": hub.stats(),
+        "write_behind": write_buffer.stats() if write_buffer is not None else None,
+        "memory": memory.stats() if memory is not None else None,
+        "chat_archive": chat_archive.stats(),
+        "archiver": archiver.stats() if archiver is not None else None
+    }
+
+@app.get("/api/llm/status")
+async def get_llm_status():
+    return {"provider": llm.name, "admission": admission.stats()}
 
-@app.post("/api/pet/create")
-async def create_pet(request: CreatePetRequest):
+# Component counters exported as gauges on each scrape
+component_stats.sources.update({
+    "pet_cache": pet_cache.stats,
+    "llm_response_cache": lambda: response_cache.stats() if response_cache is not None else None,
+    "llm_admission": admission.stats,
+    "write_behind": lambda: write_buffer.stats() if write_buffer is not None else None,
+    "ws_sessions": hub.stats,
+    "rate_limiter": lambda: rate_limiter.stats() if rate_limiter is not None else None,
+    "memory": lambda: memory.stats() if memory is not None else None,
+    "chat_archive": chat_archive.stats,
+    "archiver": lambda: archiver.stats() if archiver is not None else None,
+})
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(render_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.post("/api/pet/create", response_model=CreatePetResponse)
+async def create_pet(request: CreatePetRequest, http_request: Request):
+    await check_rate_limit("pet_create", user=request.user_id, ip=client_ip(http_request))
     try:
         # Create pet document
         pet_data = {
@@ -146,8 +560,8 @@ async def create_pet(request: CreatePetRequest):
             "last_interaction": datetime.utcnow()
         }
         
-        result = pets_collection.insert_one(pet_data)
-        pet_id = str(result.inserted_id)
+        pet_id = await database.pets.create(pet_data)
+        await invalidate_pet(pet_id)
         
         # Initialize stats
         stats_data = {
@@ -158,144 +572,392 @@ async def create_pet(request: CreatePetRequest):
             "mood": "neutral",
             "updated_at": datetime.utcnow()
         }
-        stats_collection.insert_one(stats_data)
+        await database.stats.create(stats_data)
         
         pet_data["_id"] = pet_id
-        return {"success": True, "pet": serialize_doc(pet_data)}
+        return ORJSONResponse({"success": True, "pet": pet_data, "stats": stats_data})
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/pet/{pet_id}")
-async def get_pet(pet_id: str):
+@app.get("/api/pet/{pet_id}", response_model=PetResponse)
+async def get_pet(pet_id: str, request: Request):
     try:
-        pet = pets_collection.find_one({"_id": ObjectId(pet_id)})
+        await flush_pending(pet_id)
+        pet = await database.pets.get(pet_id)
         if not pet:
             raise HTTPException(status_code=404, detail="Pet not found")
         
-        stats = stats_collection.find_one({"pet_id": pet_id})
+        stats = read_stats(await database.stats.get(pet_id))
         
-        return {
-            "pet": serialize_doc(pet),
-            "stats": serialize_doc(stats) if stats else None
-        }
+        etag = make_etag(pet_version(pet), stats_version(stats))
+        return conditional_response(request, etag, {"pet": pet, "stats": stats})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/chat")
-async def chat_with_pet(request: ChatRequest):
+async def recall_memories(request: ChatRequest) -> List[dict]:
+    """Old chats relevant to the message; the reply goes ahead without them
+    on failure, on timeout or while the pet's index is being built"""
+    if memory is None:
+        return []
     try:
-        # Get pet data
-        pet = pets_collection.find_one({"_id": ObjectId(request.pet_id)})
+        with timed(MEMORY_RECALL_LATENCY, "memory"):
+            # The newest chats are already in the prompt as recent history
+            return await asyncio.wait_for(
+                memory.recall(request.pet_id, request.message, skip_recent=CONTEXT_HISTORY_LIMIT),
+                MEMORY_RECALL_TIMEOUT
+            )
+    except asyncio.TimeoutError:
+        return []
+    except Exception as e:
+        logger.warning("Memory recall failed for pet %s: %s", request.pet_id, e)
+        return []
+
+async def prepare_chat(request: ChatRequest):
+    """Load the pet and build the LLM message list for a chat request"""
+    # Taken before the read so a chat flushed meanwhile is found in one or the other
+    pending = write_buffer.pending_chats(request.pet_id) if write_buffer is not None else []
+
+    # Get pet data (usually cached), recent chat history and memories concurrently
+    (pet, personality_prompt), recent_chats, memories = await asyncio.gather(
+        load_pet(request.pet_id),
+        database.chats.recent(request.pet_id, CONTEXT_HISTORY_LIMIT, projection=CONTEXT_PROJECTION),
+        recall_memories(request)
+    )
+    if not pet:
+        raise HTTPException(status_code=404, detail="Pet not found")
+    if pending:
+        stored = {chat["_id"] for chat in recent_chats}
+        unwritten = [chat for chat in reversed(pending) if chat["_id"] not in stored]
+        recent_chats = (unwritten + recent_chats)[:CONTEXT_HISTORY_LIMIT]
+
+    # System prompt, optional rolling summary, memories and as much recent history as fits the budget
+    messages = build_context(
+        personality_prompt,
+        recent_chats,
+        request.message,
+        CONTEXT_TOKEN_BUDGET,
+        summary=pet.get("conversation_summary"),
+        memories=memories
+    )
+    return pet, messages
+
+async def generate_reply(messages: List[dict]) -> str:
+    """LLM reply for `messages`, served from the response cache when enabled"""
+    async def complete():
+        with llm_call(llm.name, "complete"):
+            result = await llm.complete(messages, LLM_MAX_TOKENS)
+        record_llm_tokens(llm.name, result.prompt_tokens, result.completion_tokens)
+        return result
+
+    def call():
+        return admission.run(complete)
+
+    if response_cache is None:
+        result = await call()
+    else:
+        result = await response_cache.get_or_compute(messages, call)
+    return result.text.strip()
+
+async def stream_reply(messages: List[dict]):
+    """Stream LLM reply chunks; a cached reply is sent as a single chunk"""
+    cached = response_cache.get(messages) if response_cache is not None else None
+    if cached is not None:
+        yield cached.text
+        return
+
+    started = time.perf_counter()
+    chunks = []
+    async with admission.slot() as within_deadline:
+        with llm_call(llm.name, "stream"):
+            async for text in within_deadline(llm.stream(messages, LLM_MAX_TOKENS)):
+                if not chunks:
+                    LLM_FIRST_TOKEN.labels(llm.name).observe(time.perf_counter() - started)
+                chunks.append(text)
+                yield text
+    record_llm_tokens(
+        llm.name,
+        sum(estimate_tokens(m["content"]) for m in messages),
+        estimate_tokens("".join(chunks))
+    )
+    if response_cache is not None and chunks:
+        response_cache.set(messages, LLMResult(text="".join(chunks)), time.perf_counter() - started)
+
+def fallback_response(pet: dict) -> str:
+    return f"{pet.get('name', 'MIA')} diyor ki: Merhaba!"
+
+async def persist_chat(request: ChatRequest, response_text: str, user_sentiment: float, emotion: str):
+    """Persist the exchange: chat log, pet touch and stats in one concurrent stage.
+
+    With write-behind the chat log and touch are buffered and only the
+    stats update, whose result is returned, is awaited.
+    """
+    now = datetime.utcnow()
+    chat_doc = {
+        "pet_id": request.pet_id,
+        "user_message": request.message,
+        "ai_response": response_text,
+        "user_sentiment": user_sentiment,
+        "emotion": emotion,
+        "timestamp": now
+    }
+    if memory is not None:
+        chat_doc["embedding"] = memory.embed_exchange(request.message, response_text)
+    stats_update = database.stats.apply_deltas(
+        request.pet_id,
+        INTERACTION_STAT_DELTAS,
+        {"mood": emotion, "updated_at": now},
+        decay=pending_decay(now)
+    )
+    if write_buffer is not None:
+        await write_buffer.add_chat(chat_doc)
+        write_buffer.touch(request.pet_id, now)
+        stats = await stats_update
+    else:
+        _, _, stats = await asyncio.gather(
+            database.chats.insert(chat_doc),
+            database.pets.touch(request.pet_id, now),
+            stats_update
+        )
+    # Keep a cached pet in step with the touch; the prompt is unaffected
+    entry = pet_cache.peek(request.pet_id)
+    if entry is not None:
+        entry[0]["last_interaction"] = now
+    await hub.publish(request.pet_id, {"type": "stats", "stats": stats})
+    return stats
+
+async def chat_events(request: ChatRequest, pet: dict, messages: List[dict]):
+    """(event, data) pairs of a streamed exchange: `meta` with the emotion
+    right away, a `token` per reply chunk, then `done` once persisted"""
+    # Sentiment only depends on the user message, so it can go out first
+    with timed(SENTIMENT_LATENCY, "sentiment"):
+        user_sentiment = analyze_sentiment(request.message)
+    emotion = get_emotion_from_sentiment(user_sentiment)
+    yield "meta", {"emotion": emotion, "sentiment_score": user_sentiment}
+
+    chunks = []
+    try:
+        async for text in stream_reply(messages):
+            chunks.append(text)
+            yield "token", {"text": text}
+    except Exception as e:
+        logger.warning("LLM stream failed after %d chunks: %r", len(chunks), e)
+        if not chunks:
+            chunks.append(fallback_response(pet))
+            yield "token", {"text": chunks[0]}
+
+    response_text = "".join(chunks).strip()
+    try:
+        stats = await persist_chat(request, response_text, user_sentiment, emotion)
+    except Exception as e:
+        yield "error", {"detail": str(e)}
+        return
+
+    yield "done", {
+        "success": True,
+        "response": response_text,
+        "emotion": emotion,
+        "sentiment_score": user_sentiment,
+        "stats": stats
+    }
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {dumps(data).decode()}\n\n"
+
+@app.get("/api/pet/{pet_id}/bootstrap", response_model=BootstrapResponse)
+async def bootstrap_pet(pet_id: str, history_limit: int = HISTORY_PAGE_SIZE):
+    """Everything the home screen needs on open, gathered concurrently:
+    pet, current stats, the newest history page and inactivity status"""
+    try:
+        history_limit = max(1, min(history_limit, MAX_HISTORY_PAGE_SIZE))
+        await flush_pending(pet_id)
+        pet, stats, (chats, has_more) = await asyncio.gather(
+            database.pets.get(pet_id),
+            database.stats.get(pet_id),
+            chat_archive.page(pet_id, history_limit, projection=HISTORY_PROJECTION)
+        )
         if not pet:
             raise HTTPException(status_code=404, detail="Pet not found")
         
-        # Get recent chat history (last 10 messages)
-        recent_chats = list(
-            chats_collection.find(
-                {"pet_id": request.pet_id}
-            ).sort("_id", -1).limit(10)
-        )
-                    # Build messages for OpenAI ChatCompletion
-        messages = []
-        # Add system prompt based on personality
-        messages.append({"role": "system", "content": personality_prompt})
-        # Include recent chat history
-        for c in recent_chats:
-            messages.append({"role": "user", "content": c.get("User_message", "")})
-            messages.append({"role": "assistant", "content": c.get("ai_response", "")})
-        # Current user message
-        messages.append({"role": "user", "content": request.message})
-        # Call OpenAI chat completion or return fallback
+        stats = read_stats(stats)
+        return ORJSONResponse({
+            "pet": pet,
+            "stats": stats,
+            "history": history_page(chats, has_more),
+            "inactivity": inactivity_status(pet)
+        })
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat_with_pet(request: ChatRequest, http_request: Request):
+    await check_rate_limit("chat", pet=request.pet_id, ip=client_ip(http_request))
+    try:
+        pet, messages = await prepare_chat(request)
+
+        # Call the LLM provider or return fallback
         try:
-            openai_response = await openai.ChatCompletion.acreate(
-                model="gpt-3.5-turbo",
-                messages=messages,
-                max_tokens=150
-            )
-            response_text = openai_response["choices"][0]["message"]["content"].strip()
+            response_text = await generate_reply(messages)
+        except Overloaded as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
         except Exception as e:
-            response_text = f"{pet['pet_name']} diyor ki: Merhaba!"
+            logger.warning("LLM reply failed, using fallback: %r", e)
+            response_text = fallback_response(pet)
 
-
-        recent_chats.reverse()
-        
         # Analyze user sentiment
-        user_sentiment = analyze_sentiment(request.message)
+        with timed(SENTIMENT_LATENCY, "sentiment"):
+            user_sentiment = analyze_sentiment(request.message)
         emotion = get_emotion_from_sentiment(user_sentiment)
         
-        # Create AI chat instance
-        personality_prompt = get_personality_prompt(pet)
-#        session_id = f"pet_{request.pet_id}"
-        
-        #chat = LlmChat(
-            #api_key=EMERGENT_LLM_KEY,
-            #session_id=session_id,
-            #system_message=personality_prompt
-        #).with_model("openai", "gpt-4o")
-        
-        # Send message
-#        user_message = UserMessage(text=request.message)
-#        response_text = await chat.send_message(user_message)
-        
-        # Save chat to database
-        chat_doc = {
-            "pet_id": request.pet_id,
-            "user_message": request.message,
-            "ai_response": response_text,
-            "user_sentiment": user_sentiment,
-            "emotion": emotion,
-            "timestamp": datetime.utcnow()
-        }
-        chats_collection.insert_one(chat_doc)
-        
-        # Update pet last interaction
-        pets_collection.update_one(
-            {"_id": ObjectId(request.pet_id)},
-            {"$set": {"last_interaction": datetime.utcnow()}}
-        )
+        stats = await persist_chat(request, response_text, user_sentiment, emotion)
         
-        # Update stats based on interaction
-        current_stats = stats_collection.find_one({"pet_id": request.pet_id})
-        if current_stats:
-            new_affection = min(100, current_stats.get("affection", 50) + 5)
-            new_energy = max(0, current_stats.get("energy", 50) - 2)
-            
-            stats_collection.update_one(
-                {"pet_id": request.pet_id},
-                {"$set": {
-                    "affection": new_affection,
-                    "energy": new_energy,
-                    "mood": emotion,
-                    "updated_at": datetime.utcnow()
-                }}
-            )
-        
-        return {
+        # Updated stats ride along so the client needs no follow-up fetch
+        return ORJSONResponse({
             "success": True,
             "response": response_text,
             "emotion": emotion,
-            "sentiment_score": user_sentiment
-        }
+            "sentiment_score": user_sentiment,
+            "stats": stats
+        })
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/stats/{pet_id}")
-async def get_stats(pet_id: str):
+@app.post("/api/chat/stream")
+async def chat_with_pet_stream(request: ChatRequest, http_request: Request):
+    """Server-sent events variant of /api/chat.
+
+    Emits `meta` (emotion, sentiment_score) immediately, then one `token`
+    event per generated chunk, then `done` with the full reply once the
+    exchange has been persisted.
+    """
+    await check_rate_limit("chat", pet=request.pet_id, ip=client_ip(http_request))
     try:
-        stats = stats_collection.find_one({"pet_id": pet_id})
+        pet, messages = await prepare_chat(request)
+        # Reject up front while the response can still be a 429
+        if response_cache is None or response_cache.peek(messages) is None:
+            admission.check()
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except CircuitOpen:
+        pass  # the stream falls back to the canned reply
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        async for event, data in chat_events(request, pet, messages):
+            yield sse_event(event, data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def session_chat(session: PetSession, request: ChatRequest, ip: Optional[str]) -> None:
+    """Answer one chat message on a WebSocket session"""
+    try:
+        await check_rate_limit("chat", pet=request.pet_id, ip=ip)
+        pet, messages = await prepare_chat(request)
+        if response_cache is None or response_cache.peek(messages) is None:
+            admission.check()
+    except Overloaded as e:
+        session.send({"type": "error", "status": 429, "detail": str(e), "retry_after": e.retry_after})
+        return
+    except CircuitOpen:
+        pass  # falls back to the canned reply
+    except HTTPException as e:
+        error = {"type": "error", "status": e.status_code, "detail": e.detail}
+        if e.headers and "Retry-After" in e.headers:
+            error["retry_after"] = int(e.headers["Retry-After"])
+        session.send(error)
+        return
+    except Exception as e:
+        session.send({"type": "error", "status": 500, "detail": str(e)})
+        return
+
+    async for event, data in chat_events(request, pet, messages):
+        if event == "done":
+            # The done event carries the full stats; later deltas build on it
+            session.send_stats(data["stats"])
+        session.send({"type": event, **data})
+
+@app.websocket("/api/ws/pet/{pet_id}")
+async def pet_session(websocket: WebSocket, pet_id: str):
+    """Session channel for one pet.
+
+    Client messages: `{"type": "chat", "message": ...}` and `{"type": "pong"}`
+    (or `ping`). Server messages: the chat stream events (`meta`, `token`,
+    `done`, `error`) tagged by `type`, `stats` with only the changed fields
+    (the full stats first), and `ping` heartbeats the client answers with
+    `pong`. One reply is generated at a time per session.
+    """
+    try:
+        pet = await database.pets.get(pet_id, {"_id": 1})
+    except Exception:
+        pet = None
+    if not pet:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    session = PetSession(websocket, WS_SEND_QUEUE_SIZE, WS_HEARTBEAT_SECONDS)
+    hub.subscribe(pet_id, session.on_event)
+    chat_task = None
+    try:
+        async with session:
+            session.send_stats(read_stats(await database.stats.get(pet_id)))
+            while not session.closed:
+                message = await session.receive()
+                kind = message.get("type")
+                if kind == "ping":
+                    session.send({"type": "pong"})
+                elif kind == "chat":
+                    text = str(message.get("message", "")).strip()
+                    if not text:
+                        session.send({"type": "error", "status": 400, "detail": "Empty message"})
+                    elif chat_task is not None and not chat_task.done():
+                        session.send({"type": "error", "status": 409, "detail": "A reply is still in progress"})
+                    else:
+                        chat_task = asyncio.create_task(
+                            session_chat(session, ChatRequest(pet_id=pet_id, message=text), client_ip(websocket))
+                        )
+    except (WebSocketDisconnect, asyncio.TimeoutError, ValueError, RuntimeError):
+        # ValueError: malformed JSON; RuntimeError: receive after the session closed
+        pass
+    finally:
+        hub.unsubscribe(pet_id, session.on_event)
+        if chat_task is not None and not chat_task.done():
+            chat_task.cancel()
+
+@app.get("/api/stats/{pet_id}", response_model=StatsResponse)
+async def get_stats(pet_id: str, request: Request):
+    try:
+        stats = read_stats(await database.stats.get(pet_id))
         if not stats:
             raise HTTPException(status_code=404, detail="Stats not found")
         
-        return {"stats": serialize_doc(stats)}
+        return conditional_response(request, make_etag(stats_version(stats)), {"stats": stats})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/stats/update")
-async def update_stats(request: UpdateStatsRequest):
+@app.post("/api/stats/update", response_model=UpdateStatsResponse)
+async def update_stats(request: UpdateStatsRequest, http_request: Request):
+    await check_rate_limit("stats_update", pet=request.pet_id, ip=client_ip(http_request))
     try:
-        update_fields = {"updated_at": datetime.utcnow()}
+        now = datetime.utcnow()
+        update_fields = {"updated_at": now}
         
         if request.affection is not None:
             update_fields["affection"] = max(0, min(100, request.affection))
@@ -304,54 +966,75 @@ async def update_stats(request: UpdateStatsRequest):
         if request.energy is not None:
             update_fields["energy"] = max(0, min(100, request.energy))
         
-        stats_collection.update_one(
-            {"pet_id": request.pet_id},
-            {"$set": update_fields}
-        )
-        
-        updated_stats = stats_collection.find_one({"pet_id": request.pet_id})
-        return {"success": True, "stats": serialize_doc(updated_stats)}
+        if LAZY_DECAY:
+            # Persist decay of the stats not being set along with the update
+            updated_stats = await database.stats.apply_deltas(
+                request.pet_id, {}, update_fields, decay=pending_decay(now)
+            )
+        else:
+            updated_stats = await database.stats.update(request.pet_id, update_fields)
+        if updated_stats:
+            await hub.publish(request.pet_id, {"type": "stats", "stats": updated_stats})
+        return ORJSONResponse({"success": True, "stats": updated_stats})
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/chat/history/{pet_id}")
-async def get_chat_history(pet_id: str, limit: int = 20):
+@app.get("/api/chat/history/{pet_id}", response_model=HistoryPage)
+async def get_chat_history(pet_id: str, request: Request, limit: int = HISTORY_PAGE_SIZE, before: Optional[str] = None,
+                           after: Optional[str] = None, fields: Optional[str] = None):
+    """Page through a pet's chats, oldest first within the page.
+
+    Pass `before` (the page's `before_cursor`) to scroll back to older
+    chats or `after` to fetch newer ones; `fields` limits the returned
+    fields. `has_more` tells whether the next page in that direction exists.
+    Archived chats are read from their segments once newer ones run out.
+    """
     try:
-        chats = list(chats_collection.find(
-            {"pet_id": pet_id}
-        ).sort("timestamp", -1).limit(limit))
+        if before and after:
+            raise HTTPException(status_code=400, detail="Use either before or after, not both")
+        limit = max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+        await flush_pending(pet_id)
+        chats, has_more = await chat_archive.page(
+            pet_id,
+            limit,
+            before=decode_cursor(before) if before else None,
+            after=decode_cursor(after) if after else None,
+            projection=parse_projection(fields)
+        )
         
-        chats.reverse()
-        return {"chats": [serialize_doc(chat) for chat in chats]}
+        # Chats are append-only apart from rescoring, so the page is versioned
+        # by its ids, scores and whether more follow
+        etag = make_etag(
+            request.url.query,
+            has_more,
+            [(chat["_id"], chat.get("user_sentiment"), chat.get("emotion")) for chat in chats]
+        )
+        return conditional_response(request, etag, history_page(chats, has_more))
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/check-inactive/{pet_id}")
+@app.get("/api/check-inactive/{pet_id}", response_model=InactivityStatus)
 async def check_inactive(pet_id: str):
     try:
-        pet = pets_collection.find_one({"_id": ObjectId(pet_id)})
+        await flush_pending(pet_id)
+        pet = await database.pets.get(pet_id, INACTIVE_PROJECTION)
         if not pet:
             raise HTTPException(status_code=404, detail="Pet not found")
         
-        last_interaction = pet.get("last_interaction")
-        if last_interaction:
-            time_diff = datetime.utcnow() - last_interaction
-            hours_inactive = time_diff.total_seconds() / 3600
-            
-            if hours_inactive >= 24:
-                return {
-                    "inactive": True,
-                    "hours": int(hours_inactive),
-                    "message": f"{pet.get('name', 'MIA')} misses you! 🥺"
-                }
-        
-        return {"inactive": False}
+        return ORJSONResponse(inactivity_status(pet))
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Development server; production runs `python run.py` with several workers
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
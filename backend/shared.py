@@ -0,0 +1,110 @@
+"""
+State shared between server processes.
+
+With one worker everything can live in memory. Scaled out, events such as
+stats changes must reach the worker holding a pet's WebSocket session, so
+they go through a backend selected by STATE_BACKEND:
+
+- memory (default): in-process only, correct for a single worker
+- redis: Redis pub/sub at REDIS_URL (needs the optional `redis` package)
+"""
+
+import asyncio
+import logging
+import os
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+Listener = Callable[[str, bytes], None]
+
+
+class MemoryStateBackend:
+    name = "memory"
+    shared = False
+
+    def __init__(self):
+        self._listeners: List[Listener] = []
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    def add_listener(self, listener: Listener) -> None:
+        """Call `listener(channel, payload)` for every published message"""
+        self._listeners.append(listener)
+
+    async def publish(self, channel: str, payload: bytes) -> None:
+        for listener in self._listeners:
+            listener(channel, payload)
+
+
+class RedisStateBackend(MemoryStateBackend):
+    """Pub/sub over Redis: every worker receives every published message,
+    including its own, through one pattern subscription"""
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "mia:"):
+        super().__init__()
+        self.url = url
+        self.prefix = prefix
+        self.client = None
+        self._pubsub = None
+        self._task = None
+
+    async def start(self) -> None:
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(self.url)
+        self._pubsub = self.client.pubsub()
+        await self._pubsub.psubscribe(f"{self.prefix}events:*")
+        self._task = asyncio.create_task(self._listen())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self.client is not None:
+            await self.client.aclose()
+
+    async def publish(self, channel: str, payload: bytes) -> None:
+        await self.client.publish(f"{self.prefix}events:{channel}", payload)
+
+    async def _listen(self) -> None:
+        skip = len(f"{self.prefix}events:")
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    channel = message["channel"].decode()[skip:]
+                    for listener in self._listeners:
+                        listener(channel, message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Redis subscription failed; resubscribing")
+                await asyncio.sleep(1)
+
+
+def create_state_backend(name: str = None):
+    """Build the backend selected by STATE_BACKEND (memory or redis)"""
+    name = (name or os.getenv("STATE_BACKEND", "memory")).lower()
+    if name == "memory":
+        return MemoryStateBackend()
+    if name == "redis":
+        return RedisStateBackend(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            prefix=os.getenv("REDIS_KEY_PREFIX", "mia:")
+        )
+    raise ValueError(f"Unknown STATE_BACKEND: {name}")
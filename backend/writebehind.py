@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Chat inserts and pet touches acknowledged at once and written in batches.
+
+    A background task flushes every `flush_interval` seconds, or sooner
+    once `batch_size` chats are waiting, with one unordered insert_many
+    per batch and one bulk update for all touched pets. At most
+    `max_pending` chats are held: beyond that `add_chat` waits for a flush,
+    so a slow or failing database pushes back on callers instead of
+    growing memory. A failed flush keeps its writes for the next one.
+
+    Reads that must see a pet's latest writes call `flush_pet` first, which
+    writes only that pet's chats and touch; `pending_chats` exposes
+    unwritten chats for the chat context.
+    """
+
+    def __init__(self, database, flush_interval: float, batch_size: int, max_pending: int):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._chats: Dict[str, List[dict]] = defaultdict(list)
+        self._touches: Dict[str, datetime] = {}
+        self._in_flight: Dict[str, List[dict]] = {}
+        self._pending = 0
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.flushes = 0
+        self.written = 0
+        self.failures = 0
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Stop the background task and write whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Final write-behind flush failed; %d chats and %d pet touches lost",
+                             self._pending, len(self._touches))
+
+    async def add_chat(self, chat_doc: dict) -> None:
+        # Ids are assigned here so a retried batch cannot insert twice
+        chat_doc.setdefault("_id", ObjectId())
+        while self._pending >= self.max_pending:
+            await self.flush()
+        self._chats[chat_doc["pet_id"]].append(chat_doc)
+        self._pending += 1
+        if self._pending >= self.batch_size:
+            self._wakeup.set()
+
+    def touch(self, pet_id: str, when: datetime) -> None:
+        previous = self._touches.get(pet_id)
+        if previous is None or when > previous:
+            self._touches[pet_id] = when
+
+    def pending_chats(self, pet_id: str) -> List[dict]:
+        """Chats for the pet not yet in the database, oldest first"""
+        return self._in_flight.get(pet_id, []) + self._chats.get(pet_id, [])
+
+    async def flush_pet(self, pet_id: str) -> None:
+        """Make the pet's buffered writes visible to database reads"""
+        if pet_id in self._chats or pet_id in self._touches or pet_id in self._in_flight:
+            await self.flush(pet_id)
+
+    async def flush(self, pet_id: Optional[str] = None) -> None:
+        """Write the buffered chats and touches of every pet, or only of `pet_id`"""
+        async with self._lock:
+            if pet_id is None:
+                pending, self._chats = self._chats, defaultdict(list)
+                touches, self._touches = self._touches, {}
+            else:
+                pending = {pet_id: self._chats.pop(pet_id)} if pet_id in self._chats else {}
+                touches = {pet_id: self._touches.pop(pet_id)} if pet_id in self._touches else {}
+            if not pending and not touches:
+                return
+            self._in_flight = pending
+            chats = [chat for pet_chats in pending.values() for chat in pet_chats]
+            self._pending -= len(chats)
+            written = 0
+            try:
+                for start in range(0, len(chats), self.batch_size):
+                    await self.database.chats.insert_many(chats[start:start + self.batch_size])
+                    written = min(start + self.batch_size, len(chats))
+                await self.database.pets.touch_many(touches)
+            except Exception:
+                self.failures += 1
+                self._requeue(chats[written:], touches)
+                raise
+            finally:
+                self._in_flight = {}
+                self.written += written
+            self.flushes += 1
+
+    def _requeue(self, chats: List[dict], touches: Dict[str, datetime]) -> None:
+        """Put unwritten chats back ahead of newer ones"""
+        requeued = defaultdict(list)
+        for chat in chats:
+            requeued[chat["pet_id"]].append(chat)
+        for pet_id, pet_chats in self._chats.items():
+            requeued[pet_id].extend(pet_chats)
+        self._chats = requeued
+        self._pending += len(chats)
+        for pet_id, when in touches.items():
+            self.touch(pet_id, when)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+    def stats(self) -> dict:
+        return {
+            "pending_chats": self._pending,
+            "pending_touches": len(self._touches),
+            "written": self.written,
+            "flushes": self.flushes,
+            "failures": self.failures
+        }
@@ -70,8 +70,7 @@ export default function CreatePet() {
 
       if (data.success) {
         setPet(data.pet);
-        const statsData = await api.getStats(data.pet._id);
-        setStats(statsData.stats);
+        setStats(data.stats);
         router.replace('/home');
       }
     } catch (error) {
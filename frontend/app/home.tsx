@@ -12,44 +12,66 @@ import {
 } from 'react-native';
 import { LinearGradient } from 'expo-linear-gradient';
 import { usePetStore } from '../store/petStore';
-import { api } from '../utils/api';
+import { api, openPetSession, PetSessionEvent } from '../utils/api';
 import AvatarDisplay from '../components/AvatarDisplay';
 import StatsDisplay from '../components/StatsDisplay';
 import * as Animatable from 'react-native-animatable';
 
 interface Message {
+  id?: string;
   role: 'user' | 'ai';
   content: string;
   emotion?: string;
 }
 
 export default function Home() {
-  const { pet, stats, setStats } = usePetStore();
+  const { pet, stats, setStats, bootstrap, setBootstrap } = usePetStore();
   const [message, setMessage] = useState('');
   const [messages, setMessages] = useState<Message[]>([]);
   const [loading, setLoading] = useState(false);
   const [currentEmotion, setCurrentEmotion] = useState('neutral');
   const scrollViewRef = useRef<ScrollView>(null);
+  const sessionRef = useRef<ReturnType<typeof openPetSession> | null>(null);
+  // Id of the AI message a streamed reply is written into
+  const replyIdRef = useRef<string | null>(null);
 
   useEffect(() => {
     if (pet) {
-      loadChatHistory();
-      checkInactivity();
+      loadSession();
     }
   }, [pet]);
 
+  // Live session: streamed replies and stats pushed by the server
+  useEffect(() => {
+    if (!pet) return;
+    const session = openPetSession(pet._id, handleSessionEvent);
+    sessionRef.current = session;
+    return () => {
+      sessionRef.current = null;
+      session.close();
+    };
+  }, [pet?._id]);
+
   useEffect(() => {
     if (stats) {
       setCurrentEmotion(stats.mood);
     }
   }, [stats]);
 
-  const loadChatHistory = async () => {
+  // History, stats and inactivity come from one bootstrap request; the
+  // start screen usually fetched it already
+  const loadSession = async () => {
     if (!pet) return;
     try {
-      const data = await api.getChatHistory(pet._id, 10);
+      let data = bootstrap;
+      if (!data || data.pet._id !== pet._id) {
+        data = await api.bootstrap(pet._id, 10);
+        if (data.stats) setStats(data.stats);
+      }
+      setBootstrap(null);
+
       const history: Message[] = [];
-      data.chats.forEach((chat: any) => {
+      data!.history.chats.forEach((chat: any) => {
         history.push({ role: 'user', content: chat.user_message });
         history.push({
           role: 'ai',
@@ -57,24 +79,55 @@ export default function Home() {
           emotion: chat.emotion,
         });
       });
+      if (data!.inactivity.inactive) {
+        history.push({ role: 'ai', content: data!.inactivity.message!, emotion: 'sad' });
+      }
       setMessages(history);
     } catch (error) {
-      console.error('Error loading chat history:', error);
+      console.error('Error loading chat session:', error);
     }
   };
 
-  const checkInactivity = async () => {
-    if (!pet) return;
-    try {
-      const data = await api.checkInactive(pet._id);
-      if (data.inactive) {
-        setMessages((prev) => [
-          ...prev,
-          { role: 'ai', content: data.message, emotion: 'sad' },
-        ]);
+  // Replaces the streamed reply placeholder, or appends when there is none
+  const finishReply = (reply: Message) => {
+    const replyId = replyIdRef.current;
+    replyIdRef.current = null;
+    setMessages((prev) =>
+      prev.some((m) => m.id === replyId)
+        ? prev.map((m) => (m.id === replyId ? reply : m))
+        : [...prev, reply]
+    );
+    setLoading(false);
+  };
+
+  const handleSessionEvent = (event: PetSessionEvent) => {
+    switch (event.type) {
+      case 'meta': {
+        const replyId = `reply-${Date.now()}`;
+        replyIdRef.current = replyId;
+        setCurrentEmotion(event.emotion);
+        setMessages((prev) => [...prev, { id: replyId, role: 'ai', content: '', emotion: event.emotion }]);
+        break;
       }
-    } catch (error) {
-      console.error('Error checking inactivity:', error);
+      case 'token': {
+        const replyId = replyIdRef.current;
+        setMessages((prev) =>
+          prev.map((m) => (m.id === replyId ? { ...m, content: m.content + event.text } : m))
+        );
+        break;
+      }
+      case 'done':
+        finishReply({ role: 'ai', content: event.response, emotion: event.emotion });
+        break;
+      case 'stats': {
+        // Only changed fields are sent
+        const current = usePetStore.getState().stats;
+        setStats({ ...current!, ...event.changes });
+        break;
+      }
+      case 'error':
+        finishReply({ role: 'ai', content: "Sorry, I couldn't respond. Please try again.", emotion: 'sad' });
+        break;
     }
   };
 
@@ -86,6 +139,10 @@ export default function Home() {
     setMessages((prev) => [...prev, { role: 'user', content: userMessage }]);
     setLoading(true);
 
+    if (sessionRef.current?.send(userMessage)) {
+      return;
+    }
+
     try {
       const data = await api.sendChat(pet._id, userMessage);
       if (data.success) {
@@ -95,9 +152,8 @@ export default function Home() {
         ]);
         setCurrentEmotion(data.emotion);
 
-        // Refresh stats
-        const statsData = await api.getStats(pet._id);
-        setStats(statsData.stats);
+        // The chat response carries the updated stats
+        if (data.stats) setStats(data.stats);
       }
     } catch (error) {
       console.error('Error sending message:', error);
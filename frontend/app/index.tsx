@@ -9,7 +9,7 @@ import * as Animatable from 'react-native-animatable';
 
 export default function Index() {
   const router = useRouter();
-  const { setPet, setStats, setLoading } = usePetStore();
+  const { setPet, setStats, setBootstrap, setLoading } = usePetStore();
   const [checking, setChecking] = useState(true);
 
   useEffect(() => {
@@ -20,8 +20,9 @@ export default function Index() {
     try {
       const petId = await AsyncStorage.getItem('current_pet_id');
       if (petId) {
-        const data = await api.getPet(petId);
+        const data = await api.bootstrap(petId, 10);
         if (data.pet) {
+          setBootstrap(data);
           setPet(data.pet);
           setStats(data.stats);
           router.replace('/home');
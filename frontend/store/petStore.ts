@@ -23,12 +23,21 @@ interface Stats {
   updated_at: string;
 }
 
+interface Bootstrap {
+  pet: Pet;
+  stats: Stats | null;
+  history: { chats: any[]; has_more: boolean; before_cursor: string | null };
+  inactivity: { inactive: boolean; hours?: number; message?: string };
+}
+
 interface PetState {
   pet: Pet | null;
   stats: Stats | null;
+  bootstrap: Bootstrap | null;
   isLoading: boolean;
   setPet: (pet: Pet) => void;
   setStats: (stats: Stats) => void;
+  setBootstrap: (bootstrap: Bootstrap | null) => void;
   setLoading: (loading: boolean) => void;
   clearPet: () => void;
 }
@@ -36,15 +45,17 @@ interface PetState {
 export const usePetStore = create<PetState>((set) => ({
   pet: null,
   stats: null,
+  bootstrap: null,
   isLoading: false,
   setPet: (pet) => {
     set({ pet });
     AsyncStorage.setItem('current_pet_id', pet._id);
   },
   setStats: (stats) => set({ stats }),
+  setBootstrap: (bootstrap) => set({ bootstrap }),
   setLoading: (loading) => set({ isLoading: loading }),
   clearPet: () => {
-    set({ pet: null, stats: null });
+    set({ pet: null, stats: null, bootstrap: null });
     AsyncStorage.removeItem('current_pet_id');
   },
 }));
\ No newline at end of file
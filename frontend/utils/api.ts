@@ -2,12 +2,30 @@ import Constants from 'expo-constants';
 
 const EXPO_BACKEND_URL = Constants.expoConfig?.extra?.EXPO_PUBLIC_BACKEND_URL || process.env.EXPO_PUBLIC_BACKEND_URL || '';
 // API// _BASE_URL = `${EXPO_BACKEND_URL}/api`;
-const API_BASE_URL = EXPO_BACKEND_URL ? `${EXPO_BACKEND_URL}/api` : 'http://localhost:'http://localho8001/api'';
+const API_BASE_URL = EXPO_BACKEND_URL ? `${EXPO_BACKEND_URL}/api` : 'http://localhost:8001/api';
 
-export const api = {t api = {
+// Last body and ETag per URL; the server answers 304 when they still hold
+const etagCache = new Map<string, { etag: string; body: any }>();
+
+async function getJson(url: string) {
+  const cached = etagCache.get(url);
+  const response = await fetch(url, {
+    headers: cached ? { 'If-None-Match': cached.etag } : undefined,
+  });
+  if (response.status === 304 && cached) {
+    return cached.body;
+  }
+  const body = await response.json();
+  const etag = response.headers.get('ETag');
+  if (response.ok && etag) {
+    etagCache.set(url, { etag, body });
+  }
+  return body;
+}
+
+export const api = {
   async getPersonalities() {
-    const response = await fetch(`${API_BASE_URL}/personalities`);
-    return response.json();
+    return getJson(`${API_BASE_URL}/personalities`);
   },
 
   async createPet(data: any) {
@@ -20,7 +38,12 @@ export const api = {t api = {
   },
 
   async getPet(petId: string) {
-    const response = await fetch(`${API_BASE_URL}/pet/${petId}`);
+    return getJson(`${API_BASE_URL}/pet/${petId}`);
+  },
+
+  // Pet, stats, newest history page and inactivity status in one request
+  async bootstrap(petId: string, historyLimit = 20) {
+    const response = await fetch(`${API_BASE_URL}/pet/${petId}/bootstrap?history_limit=${historyLimit}`);
     return response.json();
   },
 
@@ -34,13 +57,11 @@ export const api = {t api = {
   },
 
   async getStats(petId: string) {
-    const response = await fetch(`${API_BASE_URL}/stats/${petId}`);
-    return response.json();
+    return getJson(`${API_BASE_URL}/stats/${petId}`);
   },
 
   async getChatHistory(petId: string, limit = 20) {
-    const response = await fetch(`${API_BASE_URL}/chat/history/${petId}?limit=${limit}`);
-    return response.json();
+    return getJson(`${API_BASE_URL}/chat/history/${petId}?limit=${limit}`);
   },
 
   async checkInactive(petId: string) {
@@ -48,3 +69,75 @@ export const api = {t api = {
     return response.json();
   },
 };
+
+export interface PetSessionEvent {
+  type: 'meta' | 'token' | 'done' | 'error' | 'stats' | 'ping' | 'pong';
+  [key: string]: any;
+}
+
+// One WebSocket per open chat screen: chat messages go up, streamed reply
+// events and stats deltas come down. Heartbeat pings are answered here.
+// A dropped connection is reopened with exponential backoff; a reply still
+// in flight when it drops ends with an `error` event so callers stop waiting.
+const RECONNECT_MIN_MS = 1000;
+const RECONNECT_MAX_MS = 30000;
+
+export function openPetSession(petId: string, onEvent: (event: PetSessionEvent) => void) {
+  const url = `${API_BASE_URL.replace(/^http/, 'ws')}/ws/pet/${petId}`;
+  let socket: WebSocket;
+  let closed = false;
+  let replying = false;
+  let attempts = 0;
+  let reconnectTimer: ReturnType<typeof setTimeout> | null = null;
+
+  const connect = () => {
+    socket = new WebSocket(url);
+
+    socket.onopen = () => {
+      attempts = 0;
+    };
+
+    socket.onmessage = (message) => {
+      const event: PetSessionEvent = JSON.parse(message.data);
+      if (event.type === 'ping') {
+        socket.send(JSON.stringify({ type: 'pong' }));
+        return;
+      }
+      if (event.type === 'done' || event.type === 'error') replying = false;
+      onEvent(event);
+    };
+
+    socket.onerror = () => {
+      // Always followed by onclose, which handles the reconnect
+      console.warn('Pet session connection error');
+    };
+
+    socket.onclose = () => {
+      if (replying) {
+        replying = false;
+        onEvent({ type: 'error', status: 0, detail: 'Connection closed' });
+      }
+      if (closed) return;
+      const delay = Math.min(RECONNECT_MAX_MS, RECONNECT_MIN_MS * 2 ** attempts);
+      attempts += 1;
+      reconnectTimer = setTimeout(connect, delay);
+    };
+  };
+
+  connect();
+
+  return {
+    // false when the socket is not open; callers fall back to api.sendChat
+    send(message: string) {
+      if (socket.readyState !== WebSocket.OPEN) return false;
+      socket.send(JSON.stringify({ type: 'chat', message }));
+      replying = true;
+      return true;
+    },
+    close() {
+      closed = true;
+      if (reconnectTimer) clearTimeout(reconnectTimer);
+      socket.close();
+    },
+  };
+}
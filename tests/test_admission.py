@@ -0,0 +1,203 @@
+import asyncio
+import time
+
+import pytest
+
+from admission import AdmissionController, CircuitBreaker, CircuitOpen, Overloaded
+
+
+class Transient(Exception):
+    pass
+
+
+def make_controller(**overrides) -> AdmissionController:
+    options = dict(
+        max_concurrency=1, max_queue=1, deadline=5.0, retries=0, backoff=0.0,
+        breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60),
+        is_transient=lambda e: isinstance(e, Transient), min_call_budget=0.1
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+async def fail():
+    raise Transient()
+
+
+def half_open(breaker: CircuitBreaker) -> None:
+    breaker.failures = breaker.failure_threshold
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+
+
+def test_breaker_opens_after_threshold_and_rejects():
+    admission = make_controller()
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(Transient):
+                await admission.run(fail)
+        assert admission.breaker.state == "open"
+        with pytest.raises(CircuitOpen):
+            await admission.run(fail)
+
+    asyncio.run(scenario())
+
+
+def test_half_open_trial_success_closes():
+    admission = make_controller()
+    half_open(admission.breaker)
+
+    async def ok():
+        return "ok"
+
+    assert asyncio.run(admission.run(ok)) == "ok"
+    assert admission.breaker.state == "closed"
+    assert admission.breaker.failures == 0
+
+
+def test_half_open_trial_failure_reopens():
+    admission = make_controller()
+    half_open(admission.breaker)
+    with pytest.raises(Transient):
+        asyncio.run(admission.run(fail))
+    assert admission.breaker.state == "open"
+    assert not admission.breaker.trial_in_flight
+
+
+def test_non_transient_error_is_ignored_by_breaker():
+    admission = make_controller()
+
+    async def bad():
+        raise ValueError()
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            asyncio.run(admission.run(bad))
+    assert admission.breaker.state == "closed"
+
+
+def test_aborted_streamed_trial_releases_breaker():
+    admission = make_controller()
+    half_open(admission.breaker)
+
+    async def stream():
+        async with admission.slot():
+            yield "chunk"
+            yield "more"
+
+    async def scenario():
+        chunks = stream()
+        assert await chunks.__anext__() == "chunk"
+        # Client went away mid-stream
+        await chunks.aclose()
+
+    asyncio.run(scenario())
+    assert not admission.breaker.trial_in_flight
+    assert admission.breaker.state == "half_open"
+    assert admission.breaker.allow()
+    assert admission.running == 0
+
+
+def test_queue_full_is_overloaded():
+    admission = make_controller(max_queue=0)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+
+        running = asyncio.create_task(admission.run(slow))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            await admission.run(slow)
+        release.set()
+        await running
+
+    asyncio.run(scenario())
+    assert admission.rejected == 1
+
+
+def test_queueing_past_call_budget_is_not_an_upstream_failure():
+    admission = make_controller(deadline=0.3, min_call_budget=0.2,
+                                breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+
+    async def scenario():
+        async def slow():
+            await asyncio.sleep(0.25)
+
+        running = asyncio.create_task(admission.run(slow))
+        await asyncio.sleep(0)
+        # Waits in the queue until too little of its deadline is left
+        with pytest.raises(Overloaded):
+            await admission.run(slow)
+        await running
+
+    asyncio.run(scenario())
+    assert admission.breaker.state == "closed"
+    assert admission.breaker.failures == 0
+
+
+def test_stalled_stream_times_out_at_deadline():
+    admission = make_controller(deadline=0.2, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+
+    async def upstream():
+        yield "chunk"
+        await asyncio.sleep(10)
+        yield "never"
+
+    async def scenario():
+        chunks = []
+        with pytest.raises(asyncio.TimeoutError):
+            async with admission.slot() as within_deadline:
+                async for chunk in within_deadline(upstream()):
+                    chunks.append(chunk)
+        return chunks
+
+    assert asyncio.run(asyncio.wait_for(scenario(), 1)) == ["chunk"]
+    assert admission.breaker.state == "open"
+    assert admission.running == 0
+
+
+def test_slow_stream_reader_times_out_at_deadline():
+    admission = make_controller(deadline=0.2)
+
+    async def upstream():
+        for n in range(3):
+            yield n
+
+    async def scenario():
+        chunks = []
+        with pytest.raises(asyncio.TimeoutError):
+            async with admission.slot() as within_deadline:
+                async for chunk in within_deadline(upstream()):
+                    chunks.append(chunk)
+                    await asyncio.sleep(0.15)
+        return chunks
+
+    assert asyncio.run(scenario()) == [0, 1]
+    assert admission.running == 0
+
+
+def test_stream_queues_only_until_call_budget():
+    admission = make_controller(deadline=0.3, min_call_budget=0.2)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission.slot():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        started = time.monotonic()
+        with pytest.raises(Overloaded):
+            async with admission.slot():
+                pass
+        waited = time.monotonic() - started
+        release.set()
+        await holder
+        return waited
+
+    assert asyncio.run(scenario()) < 0.2
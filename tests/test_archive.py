@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+for module in ("bson", "cachetools", "dotenv", "httpx", "motor"):
+    pytest.importorskip(module)
+
+from archive import ChatArchive, ChatArchiver
+from database import ORIGIN
+from loadtest import InMemoryDatabase
+
+START = datetime(2026, 1, 1)
+CHATS = 230
+
+
+def archived_database():
+    """A pet with CHATS hourly chats, the oldest 200 archived in segments of 50"""
+    database = InMemoryDatabase()
+
+    async def setup():
+        pet_id = await database.pets.create({"name": "Mia"})
+        for n in range(CHATS):
+            await database.chats.insert({
+                "pet_id": pet_id, "user_message": f"message {n} about walks", "ai_response": f"reply {n}",
+                "user_sentiment": 0.5, "emotion": "happy", "timestamp": START + timedelta(hours=n)
+            })
+        archiver = ChatArchiver(database, timedelta(days=1), segment_size=50, min_segment_size=10)
+        archived = await archiver.archive_all(START + timedelta(hours=200))
+        return pet_id, archived
+
+    pet_id, archived = asyncio.run(setup())
+    assert archived == 200
+    assert len(database.chats.by_pet[pet_id]) == CHATS - 200
+    assert len(database.segments.by_pet[pet_id]) == 4
+    return database, pet_id
+
+
+def walk_backward(archive: ChatArchive, pet_id: str, limit: int):
+    async def walk():
+        chats, before = [], None
+        while True:
+            page, has_more = await archive.page(pet_id, limit, before=before)
+            chats = page + chats
+            if not has_more:
+                return chats
+            before = (page[0]["timestamp"], page[0]["_id"])
+    return asyncio.run(walk())
+
+
+def walk_forward(archive: ChatArchive, pet_id: str, limit: int):
+    async def walk():
+        chats, after = [], ORIGIN
+        while True:
+            page, has_more = await archive.page(pet_id, limit, after=after)
+            chats += page
+            if not has_more:
+                return chats
+            after = (page[-1]["timestamp"], page[-1]["_id"])
+    return asyncio.run(walk())
+
+
+@pytest.mark.parametrize("limit", [7, 30, 50, 100, 500])
+def test_page_walks_backward_across_hot_chats_and_segments(limit):
+    database, pet_id = archived_database()
+    chats = walk_backward(ChatArchive(database), pet_id, limit)
+    assert [chat["ai_response"] for chat in chats] == [f"reply {n}" for n in range(CHATS)]
+
+
+@pytest.mark.parametrize("limit", [7, 30, 50, 100, 500])
+def test_page_walks_forward_across_segments_and_hot_chats(limit):
+    database, pet_id = archived_database()
+    chats = walk_forward(ChatArchive(database), pet_id, limit)
+    assert [chat["ai_response"] for chat in chats] == [f"reply {n}" for n in range(CHATS)]
+
+
+def test_page_applies_projection_to_archived_chats():
+    database, pet_id = archived_database()
+    page, has_more = asyncio.run(
+        ChatArchive(database).page(pet_id, 3, after=ORIGIN, projection={"user_message": 1})
+    )
+    assert has_more
+    assert [set(chat) for chat in page] == [{"_id", "user_message"}] * 3
+
+
+def test_archiving_again_finds_nothing_new():
+    database, pet_id = archived_database()
+    archiver = ChatArchiver(database, timedelta(days=1), segment_size=50, min_segment_size=10)
+    assert asyncio.run(archiver.archive_all(START + timedelta(hours=200))) == 0
+    assert database.pets.docs[pet_id]["chat_archive"]["chats"] == 200
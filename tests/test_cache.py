@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("cachetools")
+
+import cache
+from cache import ResponseCache
+
+MESSAGES = [{"role": "system", "content": "You are Mia"}, {"role": "user", "content": "Hello!"}]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "perf_counter", clock)
+    return clock
+
+
+class Upstream:
+    """A compute callable that blocks until released and takes 2s of clock time"""
+
+    def __init__(self, clock: Clock, error: Exception = None):
+        self.clock = clock
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        self.clock.now += 2.0
+        if self.error is not None:
+            raise self.error
+        return f"reply {self.calls}"
+
+
+async def start_waiters(responses: ResponseCache, upstream: Upstream, count: int):
+    waiters = [asyncio.ensure_future(responses.get_or_compute(MESSAGES, upstream)) for _ in range(count)]
+    await asyncio.sleep(0)
+    return waiters
+
+
+def test_concurrent_misses_share_one_compute(clock):
+    responses = ResponseCache(maxsize=10, ttl=60)
+
+    async def scenario():
+        upstream = Upstream(clock)
+        waiters = await start_waiters(responses, upstream, 5)
+        assert responses.stats()["in_flight"] == 1
+        upstream.release.set()
+        return await asyncio.gather(*waiters), upstream.calls
+
+    values, calls = asyncio.run(scenario())
+    assert values == ["reply 1"] * 5
+    assert calls == 1
+    assert responses.peek(MESSAGES) == "reply 1"
+
+
+def test_failure_reaches_every_waiter_and_is_not_cached(clock):
+    responses = ResponseCache(maxsize=10, ttl=60)
+
+    async def scenario():
+        upstream = Upstream(clock, error=RuntimeError("upstream down"))
+        waiters = await start_waiters(responses, upstream, 3)
+        upstream.release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert responses.stats()["in_flight"] == 0
+
+        retry = Upstream(clock)
+        retry.release.set()
+        return results, await responses.get_or_compute(MESSAGES, retry), retry.calls
+
+    results, value, calls = asyncio.run(scenario())
+    assert [str(result) for result in results] == ["upstream down"] * 3
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert (value, calls) == ("reply 1", 1)
+
+
+def test_cancelled_waiter_does_not_cancel_the_fill(clock):
+    responses = ResponseCache(maxsize=10, ttl=60)
+
+    async def scenario():
+        upstream = Upstream(clock)
+        leader, follower = await start_waiters(responses, upstream, 2)
+        # The waiter that started the fill goes away (client disconnected)
+        leader.cancel()
+        await asyncio.sleep(0)
+        upstream.release.set()
+        return leader, await follower
+
+    leader, value = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert value == "reply 1"
+    assert responses.peek(MESSAGES) == "reply 1"
+
+
+def test_counters(clock):
+    responses = ResponseCache(maxsize=10, ttl=60)
+
+    async def scenario():
+        upstream = Upstream(clock)
+        waiters = await start_waiters(responses, upstream, 3)
+        upstream.release.set()
+        await asyncio.gather(*waiters)
+        # Served from the cache, whitespace and case aside
+        await responses.get_or_compute([MESSAGES[0], {"role": "user", "content": "  hello"}], upstream)
+        assert responses.get(MESSAGES) == "reply 1"
+        assert responses.get([{"role": "user", "content": "something else"}]) is None
+
+    asyncio.run(scenario())
+    stats = responses.stats()
+    assert stats["misses"] == 4  # three concurrent misses and the unknown message
+    assert stats["hits"] == 2
+    assert stats["coalesced"] == 2
+    assert stats["in_flight"] == 0
+    # Two coalesced waiters and two hits each saved the 2s upstream call
+    assert stats["saved_seconds"] == pytest.approx(8.0)
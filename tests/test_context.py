@@ -0,0 +1,28 @@
+from context import build_context, estimate_tokens
+
+
+def chat(n: int) -> dict:
+    return {"user_message": f"user message number {n}", "ai_response": f"pet reply number {n}"}
+
+
+def turn_cost(n: int) -> int:
+    return estimate_tokens(chat(n)["user_message"]) + estimate_tokens(chat(n)["ai_response"])
+
+
+def test_newest_turns_are_kept_before_summary_and_memories():
+    recent = [chat(n) for n in (3, 2, 1)]  # newest first
+    base = estimate_tokens("system") + estimate_tokens("hello")
+    budget = base + turn_cost(3) + turn_cost(2)
+    messages = build_context("system", recent, "hello", budget,
+                             summary="a long summary " * 20, memories=[chat(0)])
+    assert [m["content"] for m in messages] == [
+        "system", chat(2)["user_message"], chat(2)["ai_response"],
+        chat(3)["user_message"], chat(3)["ai_response"], "hello"
+    ]
+
+
+def test_leftover_budget_goes_to_summary_then_memories():
+    messages = build_context("system", [chat(1)], "hello", 1000, summary="walks", memories=[chat(0)])
+    assert messages[1]["content"] == "Summary of your earlier conversations: walks"
+    assert messages[2]["content"].startswith("Things you remember from earlier conversations:")
+    assert [m["role"] for m in messages[3:]] == ["user", "assistant", "user"]
@@ -0,0 +1,86 @@
+import math
+from datetime import datetime, timedelta
+
+import pytest
+
+for module in ("bson", "motor", "pymongo"):
+    pytest.importorskip(module)
+
+from database import decay_stage
+from decay import current_stats, decay_deltas
+
+HOURLY = {"hunger": 3.0, "energy": 2.0, "affection": -1.0, "mood": 0.0}
+
+
+def evaluate(expr, doc):
+    """The subset of Mongo aggregation expressions decay_stage uses"""
+    if isinstance(expr, str) and expr.startswith("$"):
+        return doc.get(expr[1:])
+    if not isinstance(expr, dict):
+        return expr
+    (op, args), = expr.items()
+    if op == "$literal":
+        return args
+    if op == "$ifNull":
+        return next((value for value in (evaluate(arg, doc) for arg in args) if value is not None), None)
+    values = [evaluate(arg, doc) for arg in args] if isinstance(args, list) else [evaluate(args, doc)]
+    if op == "$subtract":
+        a, b = values
+        # Date minus date is a number of milliseconds
+        return (a - b) // timedelta(milliseconds=1) if isinstance(a, datetime) else a - b
+    if op == "$divide":
+        return values[0] / values[1]
+    if op == "$floor":
+        return math.floor(values[0])
+    if op == "$add":
+        return sum(values)
+    if op == "$multiply":
+        return math.prod(values)
+    if op == "$max":
+        return max(values)
+    if op == "$min":
+        return min(values)
+    raise AssertionError(f"unsupported operator {op}")
+
+
+def apply_stage(stage: dict, doc: dict) -> dict:
+    return {**doc, **{field: evaluate(expr, doc) for field, expr in stage.items()}}
+
+
+STATS = [
+    {"hunger": 50, "energy": 50, "affection": 50, "mood": "neutral"},
+    {"hunger": 99, "energy": 1, "affection": 2, "mood": "happy"},
+    {"energy": 80},  # fields missing on old documents decay from the default
+]
+SPANS = [timedelta(minutes=7), timedelta(minutes=20), timedelta(hours=1, seconds=1), timedelta(days=3)]
+
+
+@pytest.mark.parametrize("stats", STATS)
+@pytest.mark.parametrize("span", SPANS)
+@pytest.mark.parametrize("since_field", ["updated_at", "decayed_at"])
+def test_decay_stage_matches_current_stats(stats, span, since_field):
+    since = datetime(2026, 3, 1, 10, 17, 23, 125000)
+    until = since + span
+    doc = {**stats, since_field: since}
+    if since_field == "decayed_at":
+        doc["updated_at"] = since - timedelta(days=1)  # decayed_at takes precedence
+
+    stored = apply_stage(decay_stage(until, HOURLY), doc)
+    computed = current_stats(doc, until, HOURLY)
+    for field in ("hunger", "energy", "affection", "mood"):
+        assert stored.get(field) == computed.get(field), field
+    assert stored["decayed_at"] == until
+
+
+def test_decay_deltas_add_up_across_runs():
+    start = datetime(2026, 3, 1, 10, 17, 23)
+    end = start + timedelta(hours=5, minutes=41)
+    whole = decay_deltas(start, end, HOURLY)
+    split = {}
+    previous = start
+    for minutes in (13, 29, 60, 85, 154, 341):
+        now = start + timedelta(minutes=minutes)
+        for field, delta in decay_deltas(previous, now, HOURLY).items():
+            split[field] = split.get(field, 0) + delta
+        previous = now
+    assert split == whole
@@ -0,0 +1,49 @@
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from httpcache import REVALIDATE, conditional_response, etag_matches, make_etag
+
+ETAG = make_etag("pet-1", datetime(2026, 3, 1, 12, 0), 42)
+
+
+def request(if_none_match=None):
+    headers = {"if-none-match": if_none_match} if if_none_match is not None else {}
+    return SimpleNamespace(headers=headers)
+
+
+def test_make_etag_is_weak_and_follows_the_version():
+    assert ETAG.startswith('W/"')
+    assert make_etag("pet-1", datetime(2026, 3, 1, 12, 0), 42) == ETAG
+    assert make_etag("pet-1", datetime(2026, 3, 1, 12, 0), 43) != ETAG
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ("", False),
+    (ETAG, True),
+    (ETAG.removeprefix("W/"), True),  # weak comparison ignores the W/ prefix
+    (f'W/"other", {ETAG}', True),
+    ('W/"other"', False),
+    ("*", True),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, ETAG) is matches
+
+
+def test_conditional_response_not_modified():
+    response = conditional_response(request(ETAG), ETAG, {"pet": "Mia"})
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["etag"] == ETAG
+    assert response.headers["cache-control"] == REVALIDATE
+
+
+def test_conditional_response_sends_content_on_mismatch():
+    response = conditional_response(request('W/"stale"'), ETAG, {"pet": "Mia"})
+    assert response.status_code == 200
+    assert response.body == b'{"pet":"Mia"}'
+    assert response.headers["etag"] == ETAG
@@ -0,0 +1,28 @@
+import pytest
+
+for module in ("bson", "cachetools", "dotenv", "motor", "pymongo"):
+    pytest.importorskip(module)
+
+from bson import ObjectId
+
+from context import CONTEXT_PROJECTION
+from database import HISTORY_PAGE_SIZE, HISTORY_PROJECTION
+from indexes import endpoint_queries
+
+
+def queries(monkeypatch, **env):
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return {endpoint: rest for endpoint, *rest in endpoint_queries(str(ObjectId()), "user-1")}
+
+
+def test_context_query_follows_the_server_settings(monkeypatch):
+    collection, query, projection, sort, limit = queries(monkeypatch, CONTEXT_HISTORY_LIMIT="35")[
+        "POST /api/chat (context)"
+    ]
+    assert (collection, projection, sort, limit) == ("chats", CONTEXT_PROJECTION, [("timestamp", -1)], 35)
+
+
+def test_history_query_reads_one_more_than_a_page(monkeypatch):
+    collection, query, projection, sort, limit = queries(monkeypatch)["GET /api/chat/history/{id}"]
+    assert (projection, limit) == (HISTORY_PROJECTION, HISTORY_PAGE_SIZE + 1)
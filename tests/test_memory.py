@@ -0,0 +1,141 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+for module in ("numpy", "bson", "cachetools", "dotenv", "httpx", "motor"):
+    pytest.importorskip(module)
+
+import numpy as np
+
+from archive import ChatArchive, ChatArchiver
+from loadtest import InMemoryDatabase
+from memory import MIN_CAPACITY, HashingEmbedder, MemoryStore, PetMemoryIndex
+
+START = datetime(2026, 1, 1)
+TOPICS = ["walks in the park", "chicken dinner", "thunder storms", "bath time", "ball games"]
+
+
+def test_embedding_is_normalised_and_stable():
+    embedder = HashingEmbedder(dim=64)
+    vector = embedder.embed("We went for a walk in the park")
+    assert vector.shape == (64,)
+    assert np.linalg.norm(vector) == pytest.approx(1.0)
+    assert np.array_equal(vector, HashingEmbedder(dim=64).embed("we went for a WALK in the park"))
+    assert not embedder.embed("").any()
+
+
+def test_similar_texts_score_higher():
+    embedder = HashingEmbedder()
+    query = embedder.embed("do you remember our walk in the park?")
+    assert query @ embedder.embed("a long walk in the park") > query @ embedder.embed("chicken dinner tonight")
+
+
+def test_stored_bytes_round_trip_and_reject_other_dimensions():
+    embedder = HashingEmbedder(dim=32)
+    vector = embedder.embed("bath time")
+    data = embedder.to_bytes(vector)
+    assert np.allclose(embedder.from_bytes(data), vector, atol=1e-3)
+    assert HashingEmbedder(dim=64).from_bytes(data) is None
+    assert embedder.from_bytes(None) is None
+
+
+def test_index_grows_by_doubling():
+    index = PetMemoryIndex(dim=4)
+    for n in range(MIN_CAPACITY + 1):
+        index.append(n, np.eye(4, dtype=np.float32)[n % 4])
+    assert len(index) == MIN_CAPACITY + 1
+    assert len(index.vectors) == 2 * MIN_CAPACITY
+    assert index.ids == list(range(MIN_CAPACITY + 1))
+
+
+def test_index_search_ranks_and_skips_recent_rows():
+    embedder = HashingEmbedder()
+    index = PetMemoryIndex(embedder.dim)
+    for n, topic in enumerate(TOPICS + ["walks in the park again"]):
+        index.append(n, embedder.embed(topic))
+    query = embedder.embed("walks in the park")
+
+    rows = [row for row, _ in index.search(query, 2)]
+    assert sorted(rows) == [0, 5]
+    assert index.search(query, 1, skip_recent=1)[0][0] == 0
+    scores = [score for _, score in index.search(query, 10)]
+    assert len(scores) == len(TOPICS) + 1
+    assert scores == sorted(scores, reverse=True)
+    assert index.search(query, 3, skip_recent=len(TOPICS) + 1) == []
+
+
+def chat_doc(pet_id: str, n: int, store: MemoryStore = None) -> dict:
+    chat = {
+        "pet_id": pet_id, "user_message": f"tell me about {TOPICS[n % len(TOPICS)]}",
+        "ai_response": f"reply {n}", "timestamp": START + timedelta(hours=n)
+    }
+    if store is not None:
+        chat["embedding"] = store.embed_exchange(chat["user_message"], chat["ai_response"])
+    return chat
+
+
+def pet_with_chats(count: int, embedded: bool = True):
+    database = InMemoryDatabase()
+    store = MemoryStore(database, HashingEmbedder(), top_k=2, min_score=0.3, archive=ChatArchive(database))
+
+    async def setup():
+        pet_id = await database.pets.create({"name": "Mia"})
+        for n in range(count):
+            await database.chats.insert(chat_doc(pet_id, n, store if embedded else None))
+        return pet_id
+
+    return database, store, asyncio.run(setup())
+
+
+async def recall_when_built(store: MemoryStore, pet_id: str, message: str, skip_recent: int = 0):
+    assert await store.recall(pet_id, message) == []  # the index is still being built
+    await store._syncs[pet_id]
+    return await store.recall(pet_id, message, skip_recent)
+
+
+def test_recall_returns_similar_chats_best_first():
+    database, store, pet_id = pet_with_chats(20)
+
+    async def scenario():
+        recalled = await recall_when_built(store, pet_id, "thunder storms")
+        # Chats stored after the build are caught up on the next recall
+        await database.chats.insert({
+            **chat_doc(pet_id, 20, store), "user_message": "fireworks at midnight",
+            "embedding": store.embed_exchange("fireworks at midnight", "reply 20")
+        })
+        return recalled, await store.recall(pet_id, "fireworks at midnight")
+
+    recalled, caught_up = asyncio.run(scenario())
+    assert [chat["user_message"] for chat in recalled] == ["tell me about thunder storms"] * 2
+    assert set(recalled[0]) == {"_id", "user_message", "ai_response", "timestamp"}
+    assert [chat["ai_response"] for chat in caught_up] == ["reply 20"]
+    assert store.stats()["vectors"] == 21
+    assert store.recalls == 2
+
+
+def test_recall_skips_recent_chats():
+    database, store, pet_id = pet_with_chats(10)
+    recalled = asyncio.run(recall_when_built(store, pet_id, "ball games", skip_recent=6))
+    # Chats 4 and 9 are about ball games but only chats 0-3 are searched
+    assert [chat["ai_response"] for chat in recalled if "ball" in chat["user_message"]] == []
+
+
+def test_chats_without_embedding_are_backfilled():
+    database, store, pet_id = pet_with_chats(10, embedded=False)
+    recalled = asyncio.run(recall_when_built(store, pet_id, "bath time"))
+    assert [chat["user_message"] for chat in recalled] == ["tell me about bath time"] * 2
+    assert store.backfilled == 10
+    assert all(store.embedder.from_bytes(chat.get("embedding")) is not None
+               for chat in database.chats.by_pet[pet_id])
+
+
+def test_recall_finds_archived_chats():
+    database, store, pet_id = pet_with_chats(30)
+    archiver = ChatArchiver(database, timedelta(days=1), segment_size=10, min_segment_size=5)
+    assert asyncio.run(archiver.archive_all(START + timedelta(hours=20))) == 20
+
+    recalled = asyncio.run(recall_when_built(store, pet_id, "chicken dinner"))
+    assert len(recalled) == 2
+    assert all(chat["user_message"] == "tell me about chicken dinner" for chat in recalled)
+    assert store.stats()["vectors"] == 30
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+import ratelimit
+from ratelimit import Limit, MemoryBucketStore, RateLimited, RateLimiter, parse_rule
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    return clock
+
+
+def take(store: MemoryBucketStore, key: str, limit: Limit):
+    return asyncio.run(store.take(key, limit))
+
+
+def test_bucket_allows_capacity_then_rejects(clock):
+    store, limit = MemoryBucketStore(), Limit(3, 60)
+    assert [take(store, "k", limit)[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_bucket_refills_continuously_up_to_capacity(clock):
+    store, limit = MemoryBucketStore(), Limit(3, 60)  # one token every 20s
+    for _ in range(3):
+        take(store, "k", limit)
+    clock.now += 19
+    assert take(store, "k", limit)[0] is False
+    clock.now += 1
+    allowed, tokens = take(store, "k", limit)
+    assert allowed and tokens == pytest.approx(0, abs=1e-9)
+    clock.now += 3600
+    assert take(store, "k", limit) == (True, 2.0)
+
+
+def test_full_buckets_are_dropped_and_count_is_capped(clock):
+    store, limit = MemoryBucketStore(max_buckets=2), Limit(2, 10)
+    take(store, "a", limit)
+    take(store, "b", limit)
+    take(store, "c", limit)
+    assert len(store) == 2  # the least recently used bucket was evicted
+    clock.now += 10
+    take(store, "d", limit)
+    assert len(store) == 1  # a, b and c have refilled completely
+
+
+def test_limiter_raises_with_quota_headers(clock):
+    limiter = RateLimiter({"chat": parse_rule("pet=2/60,ip=100/60")}, MemoryBucketStore())
+
+    async def scenario():
+        for _ in range(2):
+            await limiter.check("chat", pet="p1", ip="1.2.3.4")
+        with pytest.raises(RateLimited) as rejected:
+            await limiter.check("chat", pet="p1", ip="1.2.3.4")
+        # Other pets behind the same IP are not affected
+        await limiter.check("chat", pet="p2", ip="1.2.3.4")
+        return rejected.value
+
+    error = asyncio.run(scenario())
+    assert error.headers() == {
+        "Retry-After": "30", "X-RateLimit-Limit": "2", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "60"
+    }
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_limiter_skips_missing_keys_and_unknown_rules(clock):
+    limiter = RateLimiter({"chat": parse_rule("user=1/60")}, MemoryBucketStore())
+
+    async def scenario():
+        for _ in range(3):
+            await limiter.check("chat", user=None)
+            await limiter.check("other", user="u1")
+
+    asyncio.run(scenario())
+    assert limiter.rejected == 0
+
+
+def test_parse_rule():
+    assert parse_rule("pet=20/60, ip=120/1.5,") == {"pet": Limit(20, 60.0), "ip": Limit(120, 1.5)}
+    with pytest.raises(ValueError):
+        parse_rule("pets=20/60")
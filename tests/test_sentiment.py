@@ -0,0 +1,35 @@
+import pytest
+
+from sentiment import SentimentEngine, analyze_sentiment, default_engine
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("", 0.0),
+    ("I know the way", 0.0),  # "know" is not "no"
+    ("I am happy", 1.0),
+    ("I am not happy", -1.0),
+    ("I am not very very very happy", 1.0),  # outside the negation window
+    ("Not now, happy again", 1.0),  # a clause break ends the scope
+    ("I don’t feel good", -1.0),  # curly apostrophe
+    ("“Happy” and sad", 0.0),
+    ("'happy'", 1.0),  # ASCII quotes are not part of the word
+    ("she said 'great'", 1.0),
+    ("‘great’ and 'sad'", 0.0),
+    ("'not happy'", -1.0),
+    ("no", -1.0),  # a negator with nothing to negate counts on its own
+    ("happy happy sad", 1 / 3),
+])
+def test_score(text, expected):
+    assert analyze_sentiment(text) == pytest.approx(expected)
+
+
+def test_score_many_matches_score():
+    texts = ["I am not happy", "great, great day!", "", "never sad... ok", "İstanbul is beautiful"]
+    assert default_engine.score_many(texts) == [default_engine.score(text) for text in texts]
+
+
+def test_extend_reweights_words():
+    engine = SentimentEngine()
+    engine.extend({"Cozy": 1.0})
+    assert engine.score("so cozy") == 1.0
+    assert engine.score("not cozy") == -1.0
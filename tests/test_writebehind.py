@@ -0,0 +1,125 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("bson")
+
+from writebehind import WriteBehindBuffer
+
+
+class FlakyChats:
+    """insert_many that fails the next `failures` calls"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.docs = []
+
+    async def insert_many(self, docs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        self.docs.extend(docs)
+
+
+class Pets:
+    def __init__(self):
+        self.touches = {}
+
+    async def touch_many(self, touches):
+        self.touches.update(touches)
+
+
+def make_buffer(failures: int = 0, batch_size: int = 10) -> WriteBehindBuffer:
+    database = SimpleNamespace(chats=FlakyChats(failures), pets=Pets())
+    return WriteBehindBuffer(database, flush_interval=60, batch_size=batch_size, max_pending=100)
+
+
+def test_failed_flush_requeues_ahead_of_newer_chats():
+    buffer = make_buffer(failures=1)
+    now = datetime.utcnow()
+
+    async def scenario():
+        await buffer.add_chat({"pet_id": "a", "n": 1})
+        buffer.touch("a", now)
+        with pytest.raises(ConnectionError):
+            await buffer.flush()
+        await buffer.add_chat({"pet_id": "a", "n": 2})
+        assert [chat["n"] for chat in buffer.pending_chats("a")] == [1, 2]
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    assert [chat["n"] for chat in buffer.database.chats.docs] == [1, 2]
+    assert buffer.database.pets.touches == {"a": now}
+    assert buffer.stats()["pending_chats"] == 0
+    assert buffer.failures == 1
+
+
+def test_retried_batch_keeps_chat_ids():
+    buffer = make_buffer(failures=1)
+
+    async def scenario():
+        chat = {"pet_id": "a"}
+        await buffer.add_chat(chat)
+        assigned = chat["_id"]
+        with pytest.raises(ConnectionError):
+            await buffer.flush()
+        await buffer.flush()
+        return assigned
+
+    assigned = asyncio.run(scenario())
+    # The same _id on retry lets the unique index reject a double insert
+    assert [chat["_id"] for chat in buffer.database.chats.docs] == [assigned]
+
+
+def test_partial_batches_are_not_written_twice():
+    buffer = make_buffer(batch_size=2)
+
+    async def scenario():
+        for n in range(4):
+            await buffer.add_chat({"pet_id": "a", "n": n})
+        original = buffer.database.chats.insert_many
+        calls = []
+
+        async def fail_second(docs):
+            calls.append(docs)
+            if len(calls) == 2:
+                raise ConnectionError("database unavailable")
+            await original(docs)
+
+        buffer.database.chats.insert_many = fail_second
+        with pytest.raises(ConnectionError):
+            await buffer.flush()
+        buffer.database.chats.insert_many = original
+        await buffer.flush()
+
+    asyncio.run(scenario())
+    assert [chat["n"] for chat in buffer.database.chats.docs] == [0, 1, 2, 3]
+
+
+def test_touch_keeps_latest_interaction():
+    buffer = make_buffer()
+    now = datetime.utcnow()
+    buffer.touch("a", now)
+    buffer.touch("a", now - timedelta(minutes=5))
+    asyncio.run(buffer.flush())
+    assert buffer.database.pets.touches == {"a": now}
+
+
+def test_flush_pet_writes_only_that_pet():
+    buffer = make_buffer()
+    now = datetime.utcnow()
+
+    async def scenario():
+        await buffer.add_chat({"pet_id": "a"})
+        await buffer.add_chat({"pet_id": "b"})
+        buffer.touch("a", now)
+        buffer.touch("b", now)
+        await buffer.flush_pet("a")
+
+    asyncio.run(scenario())
+    assert [chat["pet_id"] for chat in buffer.database.chats.docs] == ["a"]
+    assert buffer.database.pets.touches == {"a": now}
+    assert len(buffer.pending_chats("b")) == 1
+    assert buffer.stats()["pending_chats"] == 1